@@ -1,11 +1,15 @@
 # Import necessary libraries and modules
-from flask import Flask, request, render_template, redirect, jsonify
+from flask import Flask, Response, request, render_template, redirect, jsonify
 import time
-from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 import configparser
-from Adafruit_IO import Client, RequestError
-from threading import Thread, Event
+import functools
+import hashlib
+import http.client
+import json
+import urllib.parse
+from Adafruit_IO import Client, Data, RequestError, ThrottlingError
+from threading import Thread, Event, Lock, Condition, local
 import os
 import busio
 import adafruit_scd4x
@@ -14,54 +18,476 @@ import sys
 import logging
 import traceback
 import signal
-from logging.handlers import RotatingFileHandler
+import atexit
+import mmap
+import struct
+import heapq
+import bisect
+import math
+import random
+import sqlite3
+import re
+from concurrent.futures import ProcessPoolExecutor
+from collections import namedtuple, deque
+from types import MappingProxyType
+from datetime import datetime
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from queue import SimpleQueue
+
+try:
+    import numpy as np
+except ImportError:  # Only needed for array views of the history store
+    np = None
+
+try:
+    import waitress
+except ImportError:  # Optional: pip install waitress for the production web server
+    waitress = None
 
 # Initialize the Flask web application
 app = Flask(__name__)
 
-# Set up logging with RotatingFileHandler
-handler = RotatingFileHandler('app.log', maxBytes=10 * 1024 * 1024, backupCount=5)
-handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
+
+class DebugRateLimit(logging.Filter):
+    """Lets through at most per_minute debug records from each logging call site, noting how many were dropped"""
+
+    def __init__(self, per_minute):
+        super().__init__()
+        self.per_minute = per_minute
+        self._sites = {}
+        self._lock = Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or not self.per_minute:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get((record.pathname, record.lineno))
+            if site is None:
+                site = self._sites[(record.pathname, record.lineno)] = [float(self.per_minute), now, 0]
+            site[0] = min(self.per_minute, site[0] + (now - site[1]) * self.per_minute / 60)
+            site[1] = now
+            if site[0] < 1:
+                site[2] += 1
+                return False
+            site[0] -= 1
+            suppressed, site[2] = site[2], 0
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} similar message(s) suppressed)"
+            record.args = None
+        return True
+
+
+# Log records are handed to a queue and written by a listener thread, so
+# logging never waits on the disk or console. The listener and its handlers
+# are started with start_logging() once the error log writer exists
+log_records = SimpleQueue()
+log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+debug_rate_limit = DebugRateLimit(6)
+log_queue_handler = QueueHandler(log_records)
+log_queue_handler.addFilter(debug_rate_limit)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
-logger.addHandler(handler)
-logger.addHandler(logging.StreamHandler())  # Also log to console
+logger.addHandler(log_queue_handler)
+
+# Settings file shared by the monitor and the web UI
+CONF_FILE = 'SingleSensorSettings.conf'
 
 # Define locations for log files
 LOG_FILE = "sensor_readings.log"
 ERROR_LOG_FILE = "error_log.log"
 
+# Buffered log lines are committed at least this often (seconds)
+LOG_FLUSH_SECONDS = 5
+
+# Directory of memory-mapped binary history segments
+HISTORY_DIR = "history"
+
+# SQLite reading history with rollups (empty HISTORY_DB_FILE setting disables it)
+HISTORY_DB_FILE = "history.db"
+# Seconds between retention passes over the history database
+HISTORY_PRUNE_SECONDS = 3600
+
+# On-disk outbox of readings waiting for Adafruit IO, and how many go per flush batch
+UPLOAD_QUEUE_FILE = "upload_queue.db"
+UPLOAD_BATCH_SIZE = 100
+
+# Adafruit IO free-tier data rate (data points per minute)
+ADAFRUIT_IO_DEFAULT_RATE_LIMIT = 30
+
 # Global event for graceful shutdown
 shutdown_event = Event()
 
 # Global variable for Adafruit IO client
 adafruit_io_client = None
 
-# Global state tracking for alerts and counters
-alert_states = {
-    'high_temp': False,
-    'low_temp': False,
-    'high_co2': False
-}
+# Background Slack alert delivery, started by run_monitoring
+alert_dispatcher = None
+
+# Compiled alert rules, built by run_monitoring and recompiled on settings changes
+alert_engine = None
 
-alert_counters = {
-    'high_temp': 0,
-    'low_temp': 0,
-    'high_co2': 0
+# Store-and-forward upload queue and its flusher, started by run_monitoring
+upload_queue = None
+upload_flusher = None
+
+# Latest reading per sensor and the pre-rendered /api/latest document built from them
+latest_readings = {}
+published_alert_states = {}
+latest_snapshot = None
+latest_lock = Lock()
+
+# Server-Sent Events: events buffered per subscriber before it is dropped, and the idle keep-alive period
+STREAM_QUEUE_SIZE = 64
+STREAM_HEARTBEAT_SECONDS = 15
+
+# Reading history database opened by run_monitoring and queried by /api/history
+history_db = None
+# /api/history fetches about this many source rows per requested point before downsampling
+HISTORY_API_OVERSAMPLE = 20
+HISTORY_API_MAX_POINTS = 10000
+
+# Applies settings changes to the running monitor, started by run_monitoring
+settings_watcher = None
+SETTINGS_POLL_SECONDS = 2
+
+# Settings that only take effect after a restart
+RESTART_SETTINGS = ('SENSOR_LOG_FORMAT', 'HISTORY_DB_FILE', 'WEB_SERVER', 'WEB_THREADS',
+                    'WEB_CONNECTION_LIMIT', 'WEB_CHANNEL_TIMEOUT')
+
+# Token buckets keyed by Adafruit IO username
+rate_limiters = {}
+rate_limiters_lock = Lock()
+
+# Timer thread that runs network retries, and one circuit breaker per destination
+retry_scheduler = None
+circuit_breakers = {}
+circuit_breakers_lock = Lock()
+
+# Shared Slack client, built from settings by configure_slack
+slack_client = None
+SLACK_API_URL = 'https://slack.com/api/'
+
+# Default I2C pins (SCL, SDA) used when a sensor does not specify its own bus
+DEFAULT_I2C_PINS = (3, 2)
+
+# Seconds between data-ready polls of a sensor whose next measurement is not ready yet
+SENSOR_POLL_INTERVAL = 1
+
+# The SCD4x produces a new periodic measurement roughly this often (seconds)
+SCD4X_MEASUREMENT_PERIOD = 5
+
+# Reading fields an alert rule can test, and the comparators it can use
+ALERT_METRICS = ('temperature_f', 'temperature_c', 'humidity', 'co2')
+ALERT_COMPARATORS = ('>=', '>', '<=', '<')
+ALERT_STATISTICS = ('mean', 'min', 'max', 'stddev')
+
+# Sensor x rule pairs from which the alert table is evaluated with NumPy
+ALERT_VECTOR_MIN_PAIRS = 256
+
+# Optional settings: key -> (default, allowed values or None)
+OPTIONAL_SETTINGS = {
+    # Value used for alert checks: the last sample, the interval mean, or the
+    # interval extreme (max for high thresholds, min for low thresholds)
+    'ALERT_VALUE_MODE': ('last', ('last', 'mean', 'extreme')),
+    # Interval statistic uploaded to Adafruit IO
+    'REPORT_STATISTIC': ('mean', ('last', 'mean', 'min', 'max')),
+    # Pending Slack alerts kept in memory, and what to discard when full
+    'ALERT_QUEUE_SIZE': (100, None),
+    'ALERT_QUEUE_OVERFLOW': ('coalesce', ('coalesce', 'drop')),
+    # 'batch' sends a sensor's three values in one group request, 'feed' one request per feed
+    'ADAFRUIT_IO_UPLOAD_MODE': ('batch', ('batch', 'feed')),
+    # Readings kept on disk while Adafruit IO is unreachable
+    'UPLOAD_QUEUE_MAX_ENTRIES': (100000, None),
+    'UPLOAD_QUEUE_RETENTION_DAYS': (30, None),
+    # Account data rate (points per minute); a backlog that cannot be sent within
+    # the horizon at this rate is coalesced into averaged points
+    'ADAFRUIT_IO_RATE_LIMIT': (ADAFRUIT_IO_DEFAULT_RATE_LIMIT, None),
+    'UPLOAD_BACKLOG_HORIZON_MINUTES': (60, None),
+    # 'binary' stores every frame in the memory-mapped history store, 'text'
+    # appends one line per interval to LOG_FILE, 'both' does both
+    'SENSOR_LOG_FORMAT': ('binary', ('binary', 'text', 'both')),
+    # Queryable SQLite history; raw readings are pruned after the retention
+    # period, 1-minute rollups after theirs, hourly and daily rollups are kept
+    'HISTORY_DB_FILE': (HISTORY_DB_FILE, None),
+    'HISTORY_RAW_RETENTION_DAYS': (30, None),
+    'HISTORY_MINUTE_RETENTION_DAYS': (365, None),
+    # Sensor and error log lines are group-committed every LOG_FLUSH_SECONDS;
+    # fsync after every commit, periodically, or never
+    'LOG_DURABILITY': ('periodic', ('commit', 'periodic', 'never')),
+    'LOG_FLUSH_SECONDS': (LOG_FLUSH_SECONDS, None),
+    # Application log level, and debug records allowed per minute from each
+    # logging call (0 for no limit); both are written by a background thread
+    'LOG_LEVEL': ('DEBUG', ('DEBUG', 'INFO', 'WARNING', 'ERROR')),
+    'LOG_DEBUG_PER_MINUTE': (6, None),
+    # Web UI server: 'waitress' (threaded production server, if installed) or
+    # Flask's 'development' server; worker threads, open connection limit, and
+    # seconds an idle or stalled keep-alive connection is kept before closing
+    'WEB_SERVER': ('waitress', ('waitress', 'development')),
+    'WEB_THREADS': (24, None),
+    'WEB_CONNECTION_LIMIT': (100, None),
+    'WEB_CHANNEL_TIMEOUT': (60, None),
+    # Concurrent /api/stream subscribers; each holds a web worker thread
+    'STREAM_MAX_CLIENTS': (16, None),
 }
 
+class Metric:
+    """Prometheus metric whose values are sharded per thread.
+
+    Each thread only ever updates its own slots, so recording takes no lock
+    and loses no updates; a scrape sums the shards.
+    """
+
+    def __init__(self, name, description, kind, labelnames=(), slots=1):
+        self.name = name
+        self.description = description
+        self.kind = kind
+        self.labelnames = labelnames
+        self.slots = slots
+        self._local = local()
+        self._shards = []
+        self._lock = Lock()
+        metrics_registry.append(self)
+
+    def _slots(self, labels):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        values = shard.get(labels)
+        if values is None:
+            values = shard[labels] = [0] * self.slots
+        return values
+
+    def collect(self):
+        """Return {labels: summed slots} across all threads"""
+        totals = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for labels, values in list(shard.items()):
+                total = totals.setdefault(labels, [0] * self.slots)
+                for i, value in enumerate(values):
+                    total[i] += value
+        return totals
+
+    def _label_text(self, labels, extra=()):
+        pairs = list(zip(self.labelnames, labels)) + list(extra)
+        return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}' if pairs else ''
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for labels, values in sorted(self.collect().items()):
+            lines.append(f"{self.name}{self._label_text(labels)} {values[0]}")
+        return lines
+
+
+class Counter(Metric):
+    def __init__(self, name, description, labelnames=()):
+        super().__init__(name, description, 'counter', labelnames)
+
+    def inc(self, amount=1, labels=()):
+        self._slots(labels)[0] += amount
+
+
+class Histogram(Metric):
+    """Fixed-bucket histogram; buckets are upper bounds in seconds"""
+
+    def __init__(self, name, description, buckets, labelnames=()):
+        self.buckets = tuple(buckets)
+        # One count per bucket plus +Inf, then the sum
+        super().__init__(name, description, 'histogram', labelnames, len(self.buckets) + 2)
+
+    def observe(self, value, labels=()):
+        values = self._slots(labels)
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, values in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._label_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {values[-1]}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {cumulative}")
+        return lines
+
+
+class Gauge(Metric):
+    """Gauge read at scrape time from sample(), which returns {labels: value}"""
+
+    def __init__(self, name, description, sample, labelnames=()):
+        super().__init__(name, description, 'gauge', labelnames)
+        self.sample = sample
+
+    def collect(self):
+        return {labels: [value] for labels, value in self.sample().items()}
+
+
+def total(counter):
+    """Sum of a counter over all its label sets"""
+    return sum(values[0] for values in counter.collect().values())
+
+
+def instrument(histogram, outcomes=None, labels=()):
+    """Time every call into histogram; count outcomes as 'ok' (truthy result), 'failed' (falsy) or 'error' (raised)"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                if outcomes is not None:
+                    outcomes.inc(labels=labels + ('error',))
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start, labels)
+            if outcomes is not None:
+                outcomes.inc(labels=labels + ('ok' if result else 'failed',))
+            return result
+        return wrapper
+    return decorate
+
+
+metrics_registry = []
+I2C_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+DECODE_BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.001)
+NETWORK_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LOG_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01)
+DELIVERY_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 300, 900)
+DATA_READY_SECONDS = Histogram('scd4x_data_ready_seconds', "Duration of SCD4x data_ready polls", I2C_BUCKETS)
+DATA_READY_POLLS = Counter('scd4x_data_ready_polls_total', "SCD4x data_ready polls by result", ('ready',))
+DECODE_SECONDS = Histogram('scd4x_decode_seconds', "Duration of measurement frame CRC checks and decoding", DECODE_BUCKETS)
+DECODE_ERRORS = Counter('scd4x_decode_errors_total', "Measurement frames rejected by the CRC check")
+I2C_TRANSACTIONS = Counter('scd4x_i2c_transactions_total', "I2C transactions sent to SCD4x sensors")
+FRAMES_READ = Counter('scd4x_frames_total', "Measurement frames read from SCD4x sensors")
+I2C_PER_READING = Gauge('scd4x_i2c_transactions_per_reading', "Average I2C transactions spent per measurement frame",
+                        lambda: {(): total(I2C_TRANSACTIONS) / total(FRAMES_READ)} if total(FRAMES_READ) else {})
+SLACK_SECONDS = Histogram('slack_alert_seconds', "Duration of send_slack_alert calls", NETWORK_BUCKETS)
+SLACK_RESULTS = Counter('slack_alerts_total', "send_slack_alert calls by result", ('result',))
+SLACK_RETRIES = Counter('slack_alert_retries_total', "Slack alert deliveries scheduled for retry")
+ALERT_OUTCOMES = Counter('alert_dispatch_total', "Queued Slack alerts by outcome",
+                         ('result',))
+ALERT_DELIVERY_SECONDS = Histogram('alert_delivery_seconds', "Time from queueing a Slack alert to its delivery",
+                                   DELIVERY_BUCKETS)
+ADAFRUIT_SECONDS = Histogram('adafruit_io_request_seconds', "Duration of Adafruit IO uploads by request type",
+                             NETWORK_BUCKETS, ('request',))
+ADAFRUIT_RESULTS = Counter('adafruit_io_requests_total', "Adafruit IO uploads by request type and result",
+                           ('request', 'result'))
+ADAFRUIT_RETRIES = Counter('adafruit_io_retries_total', "Upload flushes that failed and were scheduled for retry")
+ADAFRUIT_BUDGET_CONSUMED = Counter('adafruit_io_rate_consumed_points_total', "Data points taken from the rate budget")
+ADAFRUIT_BUDGET_DEFERRED = Counter('adafruit_io_rate_deferred_total', "Uploads deferred for lack of rate budget")
+ADAFRUIT_THROTTLED = Counter('adafruit_io_throttled_total', "Throttling responses from Adafruit IO")
+ADAFRUIT_COALESCED = Counter('adafruit_io_coalesced_points_total', "Queued data points averaged to fit the rate budget")
+ADAFRUIT_BUDGET_TOKENS = Gauge('adafruit_io_rate_tokens', "Data points the account's rate budget allows right now",
+                               lambda: {(username,): bucket.available()
+                                        for username, bucket in list(rate_limiters.items())},
+                               ('account',))
+ADAFRUIT_RATE_LIMIT = Gauge('adafruit_io_rate_limit_points_per_minute', "The account's Adafruit IO data rate limit",
+                            lambda: {(username,): bucket.points_per_minute
+                                     for username, bucket in list(rate_limiters.items())},
+                            ('account',))
+LOG_ERROR_SECONDS = Histogram('log_error_seconds', "Duration of log_error calls", LOG_BUCKETS)
+ERRORS_LOGGED = Counter('errors_logged_total', "Errors written to the error log")
+
+
+# Whether each alert is raised, keyed by sensor ID then rule name (maintained by alert_engine)
+alert_states = {}
+
+
+class SlackClient:
+    """Slack Web API client that keeps one HTTPS connection alive across alerts"""
+
+    def __init__(self, token, channel, base_url=SLACK_API_URL, timeout=10):
+        self.token = token
+        self.channel = channel
+        self.timeout = timeout
+        url = urllib.parse.urlsplit(base_url)
+        self._connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self._host = url.hostname
+        self._port = url.port
+        self._path = url.path.rstrip('/') + '/'
+        self._headers = {
+            'Authorization': f"Bearer {token}",
+            'Content-Type': 'application/json; charset=utf-8',
+        }
+        self._connection = None
+        self._lock = Lock()
+
+    def close(self):
+        with self._lock:
+            self._drop_connection()
+
+    def _drop_connection(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _call(self, method, payload):
+        body = json.dumps(payload).encode('utf-8')
+        with self._lock:
+            while True:
+                reused = self._connection is not None
+                try:
+                    if not reused:
+                        self._connection = self._connection_class(self._host, self._port, timeout=self.timeout)
+                        self._connection.connect()
+                        # Headers and body go out in separate writes; don't let Nagle hold the body back
+                        self._connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    self._connection.request('POST', self._path + method, body, self._headers)
+                    response = self._connection.getresponse()
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                    self._drop_connection()
+                    # The server closed the idle kept-alive connection before answering:
+                    # retry once on a new one. Never retry a new connection
+                    if reused:
+                        continue
+                    raise
+                except (http.client.HTTPException, OSError):
+                    # Timeouts included: Slack may already have posted the message
+                    self._drop_connection()
+                    raise
+                try:
+                    data = response.read()
+                except (http.client.HTTPException, OSError):
+                    self._drop_connection()
+                    raise
+                break
+            if response.getheader('Connection', '').lower() == 'close':
+                self._drop_connection()
+
+        result = json.loads(data) if data else {}
+        if response.status != 200 or not result.get('ok'):
+            raise SlackApiError(f"Slack API {method} failed (HTTP {response.status})", result)
+        return result
+
+    def post_message(self, text):
+        return self._call('chat.postMessage', {'channel': self.channel, 'text': text})
+
+
+def configure_slack(settings):
+    """Build the shared Slack client, rebuilding it only when the token or channel changed"""
+    global slack_client
+    client = slack_client
+    if client is None or (client.token, client.channel) != (settings['SLACK_API_TOKEN'], settings['SLACK_CHANNEL']):
+        slack_client = SlackClient(settings['SLACK_API_TOKEN'], settings['SLACK_CHANNEL'])
+        if client is not None:
+            client.close()
+    return slack_client
+
+
+@instrument(SLACK_SECONDS, SLACK_RESULTS)
 def send_slack_alert(message):
     """Send alert to Slack channel"""
     try:
-        settings = read_settings_from_conf('SingleSensorSettings.conf')
-        slack_client = WebClient(token=settings['SLACK_API_TOKEN'])
-        response = slack_client.chat_postMessage(
-            channel=settings['SLACK_CHANNEL'],
-            text=message
-        )
+        client = slack_client or configure_slack(settings_cache.get())
+        client.post_message(message)
         logger.info(f"Slack alert sent: {message}")
         return True
     except SlackApiError as e:
@@ -72,6 +498,294 @@ def send_slack_alert(message):
         return False
 
 
+def backoff_delay(attempt, base_delay, max_delay):
+    """Exponential backoff with full jitter for the given (1-based) retry attempt"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+class RetryScheduler(Thread):
+    """Runs short callbacks at their due time from a heap of timers on one thread"""
+
+    def __init__(self):
+        super().__init__(name='retry-scheduler', daemon=True)
+        self._heap = []
+        self._pending = set()  # handles still waiting in the heap; cancel() just forgets them
+        self._sequence = 0
+        self._condition = Condition()
+        self._stopped = False
+
+    def schedule(self, delay, callback):
+        """Call callback after delay seconds and return a handle for cancel()"""
+        with self._condition:
+            self._sequence += 1
+            heapq.heappush(self._heap, (time.monotonic() + delay, self._sequence, callback))
+            self._pending.add(self._sequence)
+            self._condition.notify()
+            return self._sequence
+
+    def cancel(self, handle):
+        with self._condition:
+            self._pending.discard(handle)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self.join()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if self._heap:
+                        timeout = self._heap[0][0] - time.monotonic()
+                        if timeout <= 0:
+                            break
+                        self._condition.wait(timeout)
+                    else:
+                        self._condition.wait()
+                if self._stopped:
+                    return
+                _, handle, callback = heapq.heappop(self._heap)
+                if handle not in self._pending:
+                    continue
+                self._pending.discard(handle)
+            try:
+                callback()
+            except Exception as e:
+                log_error(f"Error in scheduled retry: {e}")
+
+
+class CircuitBreaker:
+    """Stops calls to a destination after repeated failures, probing again after a cool-down.
+
+    Once the cool-down has passed the breaker is half-open: allow() admits a
+    single probe and refuses everyone else until the probe's record_success()
+    or record_failure(). A probe that never reports back is given up on after
+    another reset_timeout.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+        self._lock = Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self.retry_in() == 0 else 'open'
+
+    def retry_in(self):
+        """Seconds until the cool-down ends and a probe may be let through (0 once it has)"""
+        if self.opened_at is None:
+            return 0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now < self.opened_at + self.reset_timeout:
+                return False
+            if self.probe_started is not None and now < self.probe_started + self.reset_timeout:
+                return False
+            self.probe_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"{self.name} reachable again, closing circuit breaker")
+            self.failures = 0
+            self.opened_at = None
+            self.probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probe_started = None
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"{self.name} failed {self.failures} times in a row, opening circuit breaker")
+                # (Re)open: a failed half-open probe starts a new cool-down
+                self.opened_at = time.monotonic()
+
+
+def get_circuit_breaker(destination):
+    """Return the shared circuit breaker for a destination, creating it on first use"""
+    with circuit_breakers_lock:
+        if destination not in circuit_breakers:
+            circuit_breakers[destination] = CircuitBreaker(destination)
+        return circuit_breakers[destination]
+
+
+class AlertDispatcher(Thread):
+    """Delivers Slack alerts from a bounded queue on a background thread.
+
+    Failed alerts are handed to the retry scheduler with jittered exponential
+    backoff instead of blocking delivery of the alerts queued behind them.
+    """
+
+    def __init__(self, timer, send=None, max_size=100, overflow='coalesce', max_attempts=5,
+                 base_delay=1.0, max_delay=60.0, drain_timeout=10.0):
+        super().__init__(name='alert-dispatcher')
+        self.timer = timer
+        self.send = send or send_slack_alert
+        self.breaker = get_circuit_breaker('Slack')
+        self.max_size = max_size
+        self.overflow = overflow
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.drain_timeout = drain_timeout
+        self._queue = deque()
+        self._retrying = {}
+        self._condition = Condition()
+        self._closing = Event()
+
+        # Metrics
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self._total_latency = 0.0
+
+    @property
+    def depth(self):
+        return len(self._queue) + len(self._retrying)
+
+    def enqueue(self, message, key=None):
+        """Queue an alert; on overflow drop an older alert with the same key (coalesce) or the oldest"""
+        self._push((key, message, time.monotonic(), 0))
+
+    def _push(self, item, front=False):
+        with self._condition:
+            if len(self._queue) >= self.max_size:
+                victim = None
+                if self.overflow == 'coalesce' and item[0] is not None:
+                    victim = next((queued for queued in self._queue if queued[0] == item[0]), None)
+                if victim is not None:
+                    self._queue.remove(victim)
+                    self.coalesced += 1
+                    ALERT_OUTCOMES.inc(labels=('coalesced',))
+                else:
+                    self._queue.popleft()
+                    self.dropped += 1
+                    ALERT_OUTCOMES.inc(labels=('dropped',))
+                logger.warning(f"Alert queue full ({self.max_size}), discarded an older alert")
+            if front:
+                self._queue.appendleft(item)
+            else:
+                self._queue.append(item)
+            self._condition.notify()
+
+    def _schedule_retry(self, item, delay):
+        with self._condition:
+            if self._closing.is_set():
+                self._queue.appendleft(item)
+                return
+            token = object()
+            self._retrying[token] = (self.timer.schedule(delay, lambda: self._retry_due(token)), item)
+
+    def _retry_due(self, token):
+        with self._condition:
+            entry = self._retrying.pop(token, None)
+        if entry is not None:
+            self._push(entry[1], front=True)
+
+    def stats(self):
+        return {
+            'depth': self.depth,
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+            'mean_latency': self._total_latency / self.delivered if self.delivered else 0.0,
+            'breaker': self.breaker.state,
+        }
+
+    def close(self):
+        """Stop accepting work, deliver what is queued (bounded by drain_timeout) and join"""
+        with self._condition:
+            self._closing.set()
+            # Alerts waiting on a retry timer get their last chance in the drain
+            for handle, item in self._retrying.values():
+                self.timer.cancel(handle)
+                self._queue.appendleft(item)
+            self._retrying.clear()
+            self._condition.notify()
+        self.join()
+
+    def _deliver(self, item, draining):
+        key, message, queued_at, attempts = item
+        if not draining and not self.breaker.allow():
+            # Slack is known to be down: park the alert until the breaker lets a trial through
+            self._schedule_retry(item, self.breaker.retry_in() + backoff_delay(1, self.base_delay, self.max_delay))
+            return
+
+        if self.send(message):
+            self.breaker.record_success()
+            latency = time.monotonic() - queued_at
+            self.delivered += 1
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+            self._total_latency += latency
+            ALERT_OUTCOMES.inc(labels=('delivered',))
+            ALERT_DELIVERY_SECONDS.observe(latency)
+            logger.debug(f"Alert delivered in {latency * 1000:.0f} ms (queue depth {self.depth})")
+            return
+
+        self.breaker.record_failure()
+        attempts += 1
+        if draining or attempts >= self.max_attempts:
+            self.failed += 1
+            ALERT_OUTCOMES.inc(labels=('failed',))
+            return
+        SLACK_RETRIES.inc()
+        self._schedule_retry((key, message, queued_at, attempts),
+                             backoff_delay(attempts, self.base_delay, self.max_delay))
+
+    def run(self):
+        drain_deadline = None
+        while True:
+            with self._condition:
+                while not self._queue and not self._closing.is_set():
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                item = self._queue.popleft()
+
+            draining = self._closing.is_set()
+            if draining:
+                if drain_deadline is None:
+                    drain_deadline = time.monotonic() + self.drain_timeout
+                if time.monotonic() >= drain_deadline:
+                    with self._condition:
+                        abandoned = len(self._queue) + 1
+                        self._queue.clear()
+                    log_error(f"Alert queue drain timed out, {abandoned} alert(s) not delivered")
+                    return
+            self._deliver(item, draining)
+
+
+def queue_slack_alert(message, key=None):
+    """Hand an alert to the dispatcher, or send it inline if no dispatcher is running"""
+    if alert_dispatcher is None:
+        return send_slack_alert(message)
+    alert_dispatcher.enqueue(message, key)
+    return True
+
+
 def celsius_to_fahrenheit(celsius):
     """Convert Celsius to Fahrenheit"""
     return (celsius * 9/5) + 32
@@ -111,6 +825,12 @@ def read_settings_from_conf(conf_file):
                 settings[key] = config.getint('General', key)
             else:
                 settings[key] = config.get('General', key)
+
+        # Optional settings fall back to defaults so older configuration files keep working
+        for key, (default, choices) in OPTIONAL_SETTINGS.items():
+            settings[key] = type(default)(config.get('General', key, fallback=default))
+            if choices and settings[key] not in choices:
+                raise ValueError(f"{key} must be one of: {', '.join(choices)}")
     except configparser.NoOptionError as e:
         log_error(f"Missing {key} in configuration file.")
         raise ValueError(f"Missing {key} in configuration file.") from e
@@ -121,253 +841,2939 @@ def read_settings_from_conf(conf_file):
     return settings
 
 
-def log_error(message):
-    """Log error messages to file and console"""
-    with open(ERROR_LOG_FILE, 'a') as file:
-        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-        file.write(f"{timestamp} - ERROR: {message}\n")
-    logger.error(message)
+def read_sensor_definitions(conf_file, settings):
+    """Read [Sensor <id>] sections, falling back to a single sensor on the default bus"""
+    config = configparser.ConfigParser()
+    config.read(conf_file)
+    sensors = []
+
+    for section in config.sections():
+        if not section.lower().startswith('sensor '):
+            continue
+        sensor_id = section[len('sensor '):].strip()
+        options = config[section]
+        try:
+            mux_address = options.get('mux_address')
+            sensors.append({
+                'id': sensor_id,
+                'location': options.get('location_name', f"{settings['SENSOR_LOCATION_NAME']} {sensor_id}"),
+                'scl': options.getint('scl', DEFAULT_I2C_PINS[0]),
+                'sda': options.getint('sda', DEFAULT_I2C_PINS[1]),
+                'mux_address': int(mux_address, 0) if mux_address else None,
+                'mux_channel': options.getint('mux_channel', 0),
+                'temp_feed': options.get('temp_feed', f"{settings['ADAFRUIT_IO_TEMP_FEED']}-{sensor_id}"),
+                'humidity_feed': options.get('humidity_feed', f"{settings['ADAFRUIT_IO_HUMIDITY_FEED']}-{sensor_id}"),
+                'co2_feed': options.get('co2_feed', f"{settings['ADAFRUIT_IO_CO2_FEED']}-{sensor_id}"),
+            })
+        except ValueError as e:
+            log_error(f"Invalid sensor definition [{section}]: {e}")
+            raise ValueError(f"Invalid sensor definition [{section}]: {e}") from e
 
+    if not sensors:
+        # No sensor sections: behave like the original single-sensor setup
+        sensors.append({
+            'id': 'main',
+            'location': settings['SENSOR_LOCATION_NAME'],
+            'scl': DEFAULT_I2C_PINS[0],
+            'sda': DEFAULT_I2C_PINS[1],
+            'mux_address': None,
+            'mux_channel': 0,
+            'temp_feed': settings['ADAFRUIT_IO_TEMP_FEED'],
+            'humidity_feed': settings['ADAFRUIT_IO_HUMIDITY_FEED'],
+            'co2_feed': settings['ADAFRUIT_IO_CO2_FEED'],
+        })
 
-def send_to_adafruit(feed_key, value, group_name='castle-sensors'):
-    """Send data to Adafruit IO feed within a group"""
-    global adafruit_io_client
+    for sensor in sensors:
+        sensor['bus'] = f"{sensor['scl']}:{sensor['sda']}"
+    return sensors
 
-    if not adafruit_io_client:
-        logger.error("Adafruit IO client is not initialized.")
-        return False
 
-    try:
-        # Format value to handle different types
-        if isinstance(value, (int, float)):
-            formatted_value = f"{value:.2f}"
-        else:
-            formatted_value = str(value)
+# A rule with a window (seconds) tests that statistic over the window instead of the interval value
+AlertRule = namedtuple('AlertRule', ['name', 'metric', 'comparator', 'threshold', 'count', 'hysteresis',
+                                     'message', 'clear_message', 'sensors', 'window', 'statistic'],
+                       defaults=(0.0, 'mean'))
 
-        # Format the feed key with group name
-        full_feed_key = f"{group_name}.{feed_key}"
+# Fields available to alert message templates, used to check templates when rules are read
+ALERT_TEMPLATE_FIELDS = {'name': '', 'location': '', 'sensor': '', 'metric': '', 'value': 0.0, 'threshold': 0.0,
+                         **dict.fromkeys(ALERT_METRICS, 0.0)}
 
-        logger.debug(f"Sending to Adafruit IO - Feed: {full_feed_key}, Value: {formatted_value}")
 
-        # Retry logic
-        max_retries = 3
-        retry_delay = 2
+def builtin_alert_rules(settings):
+    """The high temperature, low temperature and high CO2 rules from the [General] thresholds"""
+    count = settings['THRESHOLD_COUNT']
+    temperature = "{temperature_f:.1f}°F ({temperature_c:.1f}°C)"
+    return [
+        AlertRule('high_temp', 'temperature_f', '>=', settings['SENSOR_THRESHOLD_TEMP'], count, 0.0,
+                  f"🔥 High temperature alert at {{location}} ({{sensor}}): {temperature}",
+                  f"✅ Temperature returned to normal at {{location}} ({{sensor}}): {temperature}", None),
+        AlertRule('low_temp', 'temperature_f', '<=', settings['SENSOR_LOWER_THRESHOLD_TEMP'], count, 0.0,
+                  f"❄️ Low temperature alert at {{location}} ({{sensor}}): {temperature}",
+                  f"✅ Temperature returned to normal at {{location}} ({{sensor}}): {temperature}", None),
+        AlertRule('high_co2', 'co2', '>=', settings['SENSOR_CO2_THRESHOLD'], count, 0.0,
+                  "⚠️ High CO2 alert at {location} ({sensor}): {co2:.0f}ppm",
+                  "✅ CO2 returned to normal at {location} ({sensor}): {co2:.0f}ppm", None),
+    ]
 
-        for attempt in range(max_retries):
-            try:
-                # Send to feed using group.feed format
-                response = adafruit_io_client.send_data(full_feed_key, formatted_value)
-                logger.debug(f"Successfully sent to Adafruit IO - Feed: {full_feed_key}, Value: {formatted_value}")
-                return True
-            except RequestError as e:
-                if attempt < max_retries - 1:
-                    logger.warning(f"Retry {attempt + 1}/{max_retries} for feed '{full_feed_key}' after error: {str(e)}")
-                    time.sleep(retry_delay)
-                else:
-                    raise
 
-    except RequestError as e:
-        log_error(f"Adafruit IO RequestError for feed '{full_feed_key}': {str(e)}")
-        return False
-    except Exception as e:
-        log_error(f"Error sending data to Adafruit IO feed '{full_feed_key}': {str(e)}\n{traceback.format_exc()}")
-        return False
+def read_alert_rules(conf_file, settings):
+    """The built-in rules, overridden, disabled or extended by [Alert <name>] sections"""
+    config = configparser.ConfigParser()
+    config.read(conf_file)
+    rules = {rule.name: rule for rule in builtin_alert_rules(settings)}
 
+    for section in config.sections():
+        if not section.lower().startswith('alert '):
+            continue
+        name = section[len('alert '):].strip()
+        options = config[section]
+        try:
+            if not options.getboolean('enabled', True):
+                rules.pop(name, None)
+                continue
+            base = rules.get(name)
+            metric = options.get('metric', base.metric if base else None)
+            comparator = options.get('comparator', base.comparator if base else '>=')
+            if metric not in ALERT_METRICS:
+                raise ValueError(f"metric must be one of: {', '.join(ALERT_METRICS)}")
+            if comparator not in ALERT_COMPARATORS:
+                raise ValueError(f"comparator must be one of: {', '.join(ALERT_COMPARATORS)}")
+            if base is None and 'threshold' not in options:
+                raise ValueError("threshold is required")
+            window = options.getfloat('window_minutes', base.window / 60 if base else 0.0) * 60
+            statistic = options.get('statistic', base.statistic if base else 'mean')
+            if window < 0:
+                raise ValueError("window_minutes must not be negative")
+            if statistic not in ALERT_STATISTICS:
+                raise ValueError(f"statistic must be one of: {', '.join(ALERT_STATISTICS)}")
+            subject = f"{window / 60:g}-minute {statistic} {metric}" if window else metric
+            # Templates are read raw so they can contain % signs
+            sensors = options.get('sensors', raw=True)
+            rule = AlertRule(
+                name, metric, comparator,
+                options.getfloat('threshold', base.threshold if base else None),
+                options.getint('count', base.count if base else settings['THRESHOLD_COUNT']),
+                options.getfloat('hysteresis', base.hysteresis if base else 0.0),
+                options.get('message', base.message if base else
+                            f"⚠️ {name} alert at {{location}} ({{sensor}}): {subject} {{value:.1f}}", raw=True),
+                options.get('clear_message', base.clear_message if base else
+                            f"✅ {name} returned to normal at {{location}} ({{sensor}}): {subject} {{value:.1f}}",
+                            raw=True),
+                frozenset(sensor.strip() for sensor in sensors.split(',') if sensor.strip()) if sensors else
+                (base.sensors if base else None),
+                window, statistic)
+            rule.message.format(**ALERT_TEMPLATE_FIELDS)
+            rule.clear_message.format(**ALERT_TEMPLATE_FIELDS)
+            rules[name] = rule
+        except (ValueError, KeyError, IndexError) as e:
+            log_error(f"Invalid alert rule [{section}]: {e}")
+            raise ValueError(f"Invalid alert rule [{section}]: {e}") from e
 
-@app.route('/')
-def home():
-    """Home page redirect to settings"""
-    return redirect('/settings')
+    return list(rules.values())
 
 
-@app.route('/settings', methods=['GET', 'POST'])
-def settings_route():
-    """Handle settings page and form submission"""
-    conf_file = 'SingleSensorSettings.conf'
-    if request.method == 'POST':
-        try:
-            action = request.form.get('action')
-            new_settings = {}
+class SettingsCache:
+    """Parsed settings, re-read only when the file's inode, mtime or size changes.
 
-            # Get current settings to determine types
-            current_settings = read_settings_from_conf(conf_file)
+    get() returns a read-only snapshot; callers holding an older snapshot keep
+    a consistent view while a newer one is published.
+    """
 
-            # Process each setting with proper type conversion
-            for key, value in request.form.items():
-                if key == 'action':
-                    continue
+    def __init__(self, conf_file=CONF_FILE):
+        self.conf_file = conf_file
+        self._lock = Lock()
+        self._current = (None, None)  # (stat key, snapshot), swapped as one reference
+        self._failed = (None, None)  # (stat key, error) of a file that did not parse
+
+    def _stat_key(self):
+        try:
+            stat = os.stat(self.conf_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def get(self):
+        key = self._stat_key()
+        cached_key, snapshot = self._current
+        if key is not None and key == cached_key:
+            return snapshot
+        with self._lock:
+            cached_key, snapshot = self._current
+            if key is None or key != cached_key:
+                # An unchanged invalid file is not re-read (and its error not logged) again
+                failed_key, error = self._failed
+                if key is not None and key == failed_key:
+                    raise error
                 try:
-                    if isinstance(current_settings[key], float):
-                        new_settings[key] = float(value)
-                    elif isinstance(current_settings[key], int):
-                        new_settings[key] = int(value)
-                    else:
-                        new_settings[key] = value.strip()  # Sanitize string inputs
-                except ValueError:
-                    return jsonify(error=f'Invalid value for {key}. Expected {type(current_settings[key]).__name__}'), 400
+                    # The key is taken before reading, so a write landing mid-read forces another read next time
+                    snapshot = MappingProxyType(read_settings_from_conf(self.conf_file))
+                except ValueError as e:
+                    self._failed = (key, e)
+                    raise
+                self._current = (key, snapshot)
+            return snapshot
 
-            # Write the new settings
-            config = configparser.ConfigParser()
-            config['General'] = {str(k): str(v) for k, v in new_settings.items()}
-            with open(conf_file, 'w') as configfile:
-                config.write(configfile)
 
-            # Handle reboot action
-            if action == "reboot":
-                return reboot_system()
+def write_config(config, conf_file=CONF_FILE):
+    """Atomically replace conf_file with config; readers see either the old or the new file"""
+    temp_file = conf_file + '.tmp'
+    with open(temp_file, 'w') as file:
+        config.write(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, conf_file)
 
-            return jsonify(message='Settings updated successfully!'), 200
 
-        except Exception as e:
-            log_error(f"Settings update error: {e}")
-            return jsonify(error=f'Error updating settings: {str(e)}'), 500
-    else:
-        try:
-            current_settings = read_settings_from_conf(conf_file)
-            return render_template('settings.html', settings=current_settings)
-        except Exception as e:
-            log_error(f"Error loading settings: {str(e)}")
-            return jsonify(error=f'Error loading settings: {str(e)}'), 500
+def validate_conf_file(conf_file):
+    """Raise ValueError unless conf_file holds valid settings, sensor definitions and alert rules"""
+    settings = read_settings_from_conf(conf_file)
+    read_sensor_definitions(conf_file, settings)
+    read_alert_rules(conf_file, settings)
 
 
-def reboot_system():
-    """Reboot the system securely using subprocess"""
-    try:
-        logger.info("System reboot requested")
-        os.system('sudo shutdown -r now')
-        return jsonify(message='System is rebooting...'), 200
-    except Exception as e:
-        log_error(f"Reboot failed: {e}")
-        return jsonify(error='Error: Failed to reboot system'), 500
+settings_cache = SettingsCache()
+# Serialises read-modify-write updates of the settings file
+settings_write_lock = Lock()
 
 
-def run_monitoring():
-    """Main monitoring function"""
-    global adafruit_io_client, alert_states, alert_counters
+class SettingsWatcher(Thread):
+    """Calls on_change(previous, current) whenever the settings file changes.
 
-    # Read settings
-    try:
-        settings = read_settings_from_conf('SingleSensorSettings.conf')
+    The file is checked every poll_interval seconds, or right away after
+    notify(). An invalid file is reported once and the last good settings stay
+    in effect.
+    """
 
-        # Initialize Adafruit IO client
-        adafruit_io_client = Client(settings['ADAFRUIT_IO_USERNAME'],
-                                  settings['ADAFRUIT_IO_KEY'])
-        group_name = settings['ADAFRUIT_IO_GROUP_NAME']  # e.g., 'castle-sensors'
-        logger.info(f"Adafruit IO client initialized successfully for group {group_name}")
-    except Exception as e:
-        log_error(f"Failed to initialize settings or Adafruit IO client: {e}")
-        sys.exit(1)
+    def __init__(self, cache, current, on_change, poll_interval=SETTINGS_POLL_SECONDS):
+        super().__init__(name='settings-watcher', daemon=True)
+        self.cache = cache
+        self.current = current
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.reloads = 0
+        self._wake = Event()
+        self._stopped = False
 
-    try:
-        # Initialize I2C for SCD4x sensor
-        i2c = busio.I2C(3, 2)  # Replace with appropriate I2C pins if different
-        sensor = adafruit_scd4x.SCD4X(i2c)
-        sensor.start_periodic_measurement()
-        logger.info("SCD4X sensor initialized successfully")
-        time.sleep(2)  # Give sensor time to start up
-    except Exception as e:
-        log_error(f"Failed to initialize sensor: {e}")
-        sys.exit(1)
+    def notify(self):
+        self._wake.set()
+
+    def run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stopped:
+                return
+            try:
+                snapshot = self.cache.get()
+            except ValueError:
+                continue
+            if snapshot is self.current:
+                continue
+            previous, self.current = self.current, snapshot
+            self.reloads += 1
+            try:
+                self.on_change(previous, snapshot)
+            except Exception as e:
+                log_error(f"Failed to apply new settings: {e}")
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        self.join()
 
-    minutes_between_reads = settings['MINUTES_BETWEEN_READS']
-    last_read_time = 0
 
-    while not shutdown_event.is_set():
+class BufferedLogWriter:
+    """Keeps a log file open and group-commits appended lines.
+
+    Lines are buffered and written together when the buffer fills, when the
+    flush interval has passed, or on close. Durability controls fsync: after
+    every commit ('commit'), at most once per fsync interval ('periodic') or
+    never ('never'). Size-based rotation and external rotation (the file being
+    moved away, e.g. by logrotate) are both handled by reopening the file.
+    """
+
+    def __init__(self, path, max_buffer=64 * 1024, flush_interval=LOG_FLUSH_SECONDS, durability='periodic',
+                 fsync_interval=60, max_bytes=0, backup_count=5):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._buffer = []
+        self._buffered = 0
+        self._file = None
+        self._inode = None
+        self._lock = Lock()
+        self._last_flush = time.monotonic()
+        self._last_fsync = time.monotonic()
+
+        # Metrics
+        self.commits = 0
+        self.fsyncs = 0
+        self.bytes_written = 0
+
+    def write(self, line):
+        with self._lock:
+            self._buffer.append(line)
+            self._buffered += len(line)
+            if self._buffered >= self.max_buffer or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._commit()
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            if self._file is not None:
+                if self.durability != 'never':
+                    self._fsync()
+                self._file.close()
+                self._file = None
+
+    def _open(self):
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._inode = os.fstat(self._file.fileno()).st_ino
+
+    def _reopen_if_moved(self):
         try:
-            current_time = time.time()
-            if current_time - last_read_time >= (minutes_between_reads * 60):
-                if sensor.data_ready:
-                    # Read sensor data and convert temperature to Fahrenheit
-                    temperature_c = sensor.temperature
-                    temperature_f = celsius_to_fahrenheit(temperature_c)
-                    humidity = sensor.relative_humidity
-                    co2 = sensor.CO2
-
-                    logger.info(f"Read values - Temp: {temperature_f:.1f}°F ({temperature_c:.1f}°C), Humidity: {humidity:.1f}%, CO2: {co2}ppm")
-
-                    # Temperature High Threshold
-                    if temperature_f >= settings['SENSOR_THRESHOLD_TEMP']:
-                        alert_counters['high_temp'] += 1
-                        if alert_counters['high_temp'] >= settings['THRESHOLD_COUNT'] and not alert_states['high_temp']:
-                            alert_msg = f"🔥 High temperature alert at {settings['SENSOR_LOCATION_NAME']}: {temperature_f:.1f}°F ({temperature_c:.1f}°C)"
-                            send_slack_alert(alert_msg)
-                            alert_states['high_temp'] = True
-                    else:
-                        alert_counters['high_temp'] = 0
-                        if alert_states['high_temp']:
-                            alert_msg = f"✅ Temperature returned to normal at {settings['SENSOR_LOCATION_NAME']}: {temperature_f:.1f}°F ({temperature_c:.1f}°C)"
-                            send_slack_alert(alert_msg)
-                            alert_states['high_temp'] = False
-
-                    # Temperature Low Threshold
-                    if temperature_f <= settings['SENSOR_LOWER_THRESHOLD_TEMP']:
-                        alert_counters['low_temp'] += 1
-                        if alert_counters['low_temp'] >= settings['THRESHOLD_COUNT'] and not alert_states['low_temp']:
-                            alert_msg = f"❄️ Low temperature alert at {settings['SENSOR_LOCATION_NAME']}: {temperature_f:.1f}°F ({temperature_c:.1f}°C)"
-                            send_slack_alert(alert_msg)
-                            alert_states['low_temp'] = True
-                    else:
-                        alert_counters['low_temp'] = 0
-                        if alert_states['low_temp']:
-                            alert_msg = f"✅ Temperature returned to normal at {settings['SENSOR_LOCATION_NAME']}: {temperature_f:.1f}°F ({temperature_c:.1f}°C)"
-                            send_slack_alert(alert_msg)
-                            alert_states['low_temp'] = False
-
-                    # CO2 High Threshold
-                    if co2 >= settings['SENSOR_CO2_THRESHOLD']:
-                        alert_counters['high_co2'] += 1
-                        if alert_counters['high_co2'] >= settings['THRESHOLD_COUNT'] and not alert_states['high_co2']:
-                            alert_msg = f"⚠️ High CO2 alert at {settings['SENSOR_LOCATION_NAME']}: {co2}ppm"
-                            send_slack_alert(alert_msg)
-                            alert_states['high_co2'] = True
-                    else:
-                        alert_counters['high_co2'] = 0
-                        if alert_states['high_co2']:
-                            alert_msg = f"✅ CO2 returned to normal at {settings['SENSOR_LOCATION_NAME']}: {co2}ppm"
-                            send_slack_alert(alert_msg)
-                            alert_states['high_co2'] = False
+            moved = os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            moved = True
+        if moved:
+            self._file.close()
+            self._open()
 
-                    # Log the readings to the log file
-                    with open(LOG_FILE, 'a') as file:
-                        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-                        file.write(f"{timestamp} - {settings['SENSOR_LOCATION_NAME']} - Temperature: {temperature_f}°F, Humidity: {humidity}%, CO2: {co2}ppm\n")
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+        self._open()
 
-                    # Send the readings to Adafruit IO
-                    send_to_adafruit(settings['ADAFRUIT_IO_TEMP_FEED'], temperature_f, settings['ADAFRUIT_IO_GROUP_NAME'])
-                    send_to_adafruit(settings['ADAFRUIT_IO_HUMIDITY_FEED'], humidity, settings['ADAFRUIT_IO_GROUP_NAME'])
-                    send_to_adafruit(settings['ADAFRUIT_IO_CO2_FEED'], co2, settings['ADAFRUIT_IO_GROUP_NAME'])
+    def _fsync(self):
+        os.fsync(self._file.fileno())
+        self.fsyncs += 1
+        self._last_fsync = time.monotonic()
 
-                    last_read_time = current_time
+    def _commit(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        data = ''.join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
 
-            time.sleep(5)  # Short sleep to prevent CPU overuse
-        except Exception as e:
-            log_error(f"Error in monitoring loop: {e}")
-            time.sleep(5)
+        if self._file is None:
+            self._open()
+        else:
+            self._reopen_if_moved()
+        if self.max_bytes and self._file.tell() + len(data) > self.max_bytes and self._file.tell() > 0:
+            self._rotate()
 
+        self._file.write(data)
+        self._file.flush()
+        self.commits += 1
+        self.bytes_written += len(data)
+        if self.durability == 'commit' or (
+                self.durability == 'periodic' and time.monotonic() - self._last_fsync >= self.fsync_interval):
+            self._fsync()
 
-def signal_handler(signum, frame):
-    """Handle shutdown signals"""
-    logger.info("Shutdown signal received. Cleaning up...")
-    shutdown_event.set()
+    def stats(self):
+        return {'commits': self.commits, 'fsyncs': self.fsyncs, 'bytes_written': self.bytes_written}
 
 
-if __name__ == '__main__':
-    # Handle shutdown signals
-    signal.signal(signal.SIGTERM, signal_handler)
-    signal.signal(signal.SIGINT, signal_handler)
+# Shared group-commit writers for the sensor and error logs
+sensor_log = BufferedLogWriter(LOG_FILE)
+error_log = BufferedLogWriter(ERROR_LOG_FILE, max_bytes=10 * 1024 * 1024)
+log_writers = (sensor_log, error_log)
 
-    try:
-        # Start the monitoring thread
-        monitoring_thread = Thread(target=run_monitoring)
-        monitoring_thread.start()
 
-        # Find an available port and start the Flask app
+def configure_log_writers(settings):
+    """Apply the durability and flush settings to the shared log writers"""
+    for writer in log_writers:
+        writer.durability = settings['LOG_DURABILITY']
+        writer.flush_interval = settings['LOG_FLUSH_SECONDS']
+
+
+def flush_log_writers():
+    """Commit buffered log lines periodically until shutdown, then close the files"""
+    while not shutdown_event.wait(min(writer.flush_interval for writer in log_writers)):
+        for writer in log_writers:
+            try:
+                writer.flush()
+            except OSError as e:
+                logger.error(f"Failed to write {writer.path}: {e}")
+    for writer in log_writers:
+        writer.close()
+
+
+class ErrorLogHandler(logging.Handler):
+    """Collects every ERROR and CRITICAL record, from log_error or any logger.error call, in the error log"""
+
+    def __init__(self, writer):
+        super().__init__(logging.ERROR)
+        self.writer = writer
+        self.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s: %(message)s', '%Y-%m-%d %H:%M:%S'))
+
+    def emit(self, record):
+        try:
+            self.writer.write(f"{self.format(record)}\n")
+            ERRORS_LOGGED.inc()
+        except Exception:
+            self.handleError(record)
+
+
+def start_logging():
+    """Start the listener thread that writes queued records to app.log, the console and the error log"""
+    file_handler = RotatingFileHandler('app.log', maxBytes=10 * 1024 * 1024, backupCount=5)
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(log_formatter)
+    listener = QueueListener(log_records, file_handler, logging.StreamHandler(), ErrorLogHandler(error_log),
+                             respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_logging():
+    """Write out every queued record, then commit the error log"""
+    log_listener.stop()
+    error_log.close()
+
+
+log_listener = start_logging()
+atexit.register(stop_logging)
+
+
+def configure_logging(settings):
+    """Apply the log level and debug rate limit settings"""
+    logger.setLevel(settings['LOG_LEVEL'])
+    debug_rate_limit.per_minute = settings['LOG_DEBUG_PER_MINUTE']
+
+
+@instrument(LOG_ERROR_SECONDS)
+def log_error(message):
+    """Log error messages to file and console"""
+    logger.error(message)
+
+
+class TokenBucket:
+    """Token bucket that spaces Adafruit IO data points to fit an account's per-minute rate limit"""
+
+    def __init__(self, points_per_minute, capacity=None):
+        self.points_per_minute = points_per_minute
+        self.rate = points_per_minute / 60
+        self.capacity = capacity or points_per_minute
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+        # Metrics
+        self.consumed = 0
+        self.deferred = 0
+        self.throttled = 0
+        self.coalesced = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self.tokens
+
+    def try_consume(self, points):
+        """Take tokens for a request of the given number of data points if the budget allows"""
+        with self._lock:
+            self._refill()
+            if self.tokens < points:
+                self.deferred += 1
+                ADAFRUIT_BUDGET_DEFERRED.inc()
+                return False
+            self.tokens -= points
+            self.consumed += points
+        ADAFRUIT_BUDGET_CONSUMED.inc(points)
+        return True
+
+    def time_until(self, points):
+        """Seconds until a request of the given size fits the budget"""
+        with self._lock:
+            self._refill()
+            return max(0.0, (min(points, self.capacity) - self.tokens) / self.rate)
+
+    def drain(self):
+        """The server throttled us: assume the budget is spent"""
+        with self._lock:
+            self._refill()
+            self.tokens = 0.0
+            self.throttled += 1
+        ADAFRUIT_THROTTLED.inc()
+
+    def stats(self):
+        return {
+            'rate_per_minute': self.rate * 60,
+            'tokens': round(self.available(), 2),
+            'capacity': self.capacity,
+            'consumed': self.consumed,
+            'deferred': self.deferred,
+            'throttled': self.throttled,
+            'coalesced': self.coalesced,
+        }
+
+
+def get_rate_limiter(username, points_per_minute=None):
+    """Return the token bucket for an Adafruit IO account, (re)creating it when the rate changes"""
+    with rate_limiters_lock:
+        bucket = rate_limiters.get(username)
+        if bucket is None or (points_per_minute and bucket.points_per_minute != points_per_minute):
+            bucket = rate_limiters[username] = TokenBucket(points_per_minute or ADAFRUIT_IO_DEFAULT_RATE_LIMIT)
+        return bucket
+
+
+def note_adafruit_throttled(error):
+    """Record a throttling response against the client's account budget"""
+    logger.warning(f"Adafruit IO throttled the upload: {str(error)}")
+    if adafruit_io_client is not None:
+        get_rate_limiter(adafruit_io_client.username).drain()
+
+
+def format_adafruit_value(value):
+    """Format a value the way Adafruit IO feeds expect it"""
+    if isinstance(value, (int, float)):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def format_created_at(timestamp):
+    """Format a Unix timestamp as the ISO 8601 UTC string Adafruit IO expects"""
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
+
+
+@instrument(ADAFRUIT_SECONDS, ADAFRUIT_RESULTS, ('feed',))
+def send_to_adafruit(feed_key, value, group_name='castle-sensors', created_at=None):
+    """Send data to Adafruit IO feed within a group; returns True when sent, None when throttled, False otherwise"""
+    global adafruit_io_client
+
+    if not adafruit_io_client:
+        logger.error("Adafruit IO client is not initialized.")
+        return False
+
+    try:
+        # Format value to handle different types
+        formatted_value = format_adafruit_value(value)
+
+        # Format the feed key with group name
+        full_feed_key = f"{group_name}.{feed_key}"
+
+        logger.debug(f"Sending to Adafruit IO - Feed: {full_feed_key}, Value: {formatted_value}")
+
+        # Single attempt: retries are scheduled by the upload flusher, never slept on here
+        if created_at:
+            adafruit_io_client.create_data(full_feed_key, Data(value=formatted_value, created_at=created_at))
+        else:
+            adafruit_io_client.send_data(full_feed_key, formatted_value)
+        logger.debug(f"Successfully sent to Adafruit IO - Feed: {full_feed_key}, Value: {formatted_value}")
+        return True
+
+    except ThrottlingError as e:
+        note_adafruit_throttled(e)
+        return None
+    except RequestError as e:
+        log_error(f"Adafruit IO RequestError for feed '{full_feed_key}': {str(e)}")
+        return False
+    except Exception as e:
+        log_error(f"Error sending data to Adafruit IO feed '{full_feed_key}': {str(e)}\n{traceback.format_exc()}")
+        return False
+
+
+@instrument(ADAFRUIT_SECONDS, ADAFRUIT_RESULTS, ('group',))
+def send_group_to_adafruit(values, group_name, created_at):
+    """Send several feed values of one group in a single request with a shared timestamp.
+
+    Returns True when sent, None when Adafruit IO throttled the request and False on any other failure.
+    """
+    if not adafruit_io_client:
+        logger.error("Adafruit IO client is not initialized.")
+        return False
+
+    payload = {
+        'feeds': [{'key': feed_key, 'value': format_adafruit_value(value)} for feed_key, value in values.items()],
+        'created_at': created_at,
+    }
+    try:
+        # The client has no public group-data call, so post to the REST endpoint through it
+        adafruit_io_client._post(f"groups/{group_name}/data", payload)
+        logger.debug(f"Successfully sent group data to Adafruit IO - Group: {group_name}, Feeds: {len(values)}")
+        return True
+    except ThrottlingError as e:
+        note_adafruit_throttled(e)
+        return None
+    except RequestError as e:
+        logger.warning(f"Adafruit IO group upload for '{group_name}' failed: {str(e)}")
+        return False
+    except Exception as e:
+        log_error(f"Error sending group data to Adafruit IO group '{group_name}': {str(e)}")
+        return False
+
+
+def reading_feed_values(definition, reading):
+    """Map a sensor's Adafruit IO feed keys to a reading's values"""
+    return {
+        definition['temp_feed']: reading.temperature_f,
+        definition['humidity_feed']: reading.humidity,
+        definition['co2_feed']: reading.co2,
+    }
+
+
+def upload_to_adafruit(settings, group_name, values, created_at):
+    """Upload one timestamped set of feed values and return the feed keys that were delivered"""
+    if settings['ADAFRUIT_IO_UPLOAD_MODE'] == 'batch':
+        sent = send_group_to_adafruit(values, group_name, created_at)
+        if sent:
+            return set(values)
+        if sent is None:
+            # Throttled: per-feed requests would only spend more of an exhausted budget
+            return set()
+        logger.warning(f"Falling back to per-feed uploads for group '{group_name}'")
+
+    delivered = set()
+    for feed_key, value in values.items():
+        sent = send_to_adafruit(feed_key, value, group_name, created_at)
+        if sent is None:
+            break
+        if sent:
+            delivered.add(feed_key)
+    return delivered
+
+
+@instrument(ADAFRUIT_SECONDS, ADAFRUIT_RESULTS, ('batch',))
+def send_backlog_to_adafruit(entries):
+    """Send queued entries through each feed's batch endpoint; return delivered (entry id, feed key) pairs"""
+    points = {}
+    for entry_id, _, group_name, values, created in entries:
+        created_at = format_created_at(created)
+        for feed_key, value in values.items():
+            points.setdefault((group_name, feed_key), []).append(
+                (entry_id, Data(value=format_adafruit_value(value), created_at=created_at)))
+
+    delivered = set()
+    for (group_name, feed_key), feed_points in points.items():
+        full_feed_key = f"{group_name}.{feed_key}"
+        try:
+            adafruit_io_client.send_batch_data(full_feed_key, [data for _, data in feed_points])
+        except ThrottlingError as e:
+            note_adafruit_throttled(e)
+            break
+        except RequestError as e:
+            logger.warning(f"Adafruit IO batch upload for feed '{full_feed_key}' failed: {str(e)}")
+            continue
+        except Exception as e:
+            log_error(f"Error sending batch data to Adafruit IO feed '{full_feed_key}': {str(e)}")
+            continue
+        delivered.update((entry_id, feed_key) for entry_id, _ in feed_points)
+    return delivered
+
+
+class UploadQueue:
+    """Crash-safe SQLite (WAL) outbox of readings waiting to be uploaded to Adafruit IO"""
+
+    def __init__(self, path=UPLOAD_QUEUE_FILE, max_entries=100000):
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created REAL NOT NULL,
+                sensor_id TEXT NOT NULL,
+                group_name TEXT NOT NULL,
+                feed_values TEXT NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_created ON outbox (created, id)")
+        self._count = self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def __len__(self):
+        return self._count
+
+    def put(self, sensor_id, group_name, values, created):
+        """Persist one reading; beyond max_entries the oldest entries are discarded"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute("INSERT INTO outbox (created, sensor_id, group_name, feed_values) VALUES (?, ?, ?, ?)",
+                             (created, sensor_id, group_name, json.dumps(values)))
+            self._count += 1
+            excess = self._count - self.max_entries
+            if excess > 0:
+                self._db.execute("DELETE FROM outbox WHERE id IN (SELECT id FROM outbox ORDER BY created, id LIMIT ?)",
+                                 (excess,))
+                self._count -= excess
+            self._db.execute("COMMIT")
+        if excess > 0:
+            logger.warning(f"Upload queue full, discarded {excess} oldest reading(s)")
+
+    def oldest(self, limit):
+        """Return up to limit entries as (id, sensor_id, group_name, values, created), oldest first"""
+        with self._lock:
+            rows = self._db.execute("SELECT id, sensor_id, group_name, feed_values, created FROM outbox "
+                                    "ORDER BY created, id LIMIT ?", (limit,)).fetchall()
+        return [(entry_id, sensor_id, group_name, json.loads(values), created)
+                for entry_id, sensor_id, group_name, values, created in rows]
+
+    def complete(self, entries, delivered):
+        """Remove delivered values; entries with nothing left are deleted"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            for entry_id, _, _, values, _ in entries:
+                remaining = {feed_key: value for feed_key, value in values.items()
+                             if (entry_id, feed_key) not in delivered}
+                if not remaining:
+                    self._db.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+                    self._count -= 1
+                elif len(remaining) < len(values):
+                    self._db.execute("UPDATE outbox SET feed_values = ? WHERE id = ?", (json.dumps(remaining), entry_id))
+            self._db.execute("COMMIT")
+
+    def pending_points(self):
+        """Number of feed values still waiting to be uploaded"""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox, json_each(outbox.feed_values)").fetchone()[0]
+
+    def coalesce(self, factor):
+        """Average every run of factor consecutive entries per sensor into one entry; return entries merged away"""
+        with self._lock:
+            rows = self._db.execute("SELECT id, sensor_id, group_name, feed_values, created FROM outbox "
+                                    "ORDER BY sensor_id, group_name, created, id").fetchall()
+            merged = 0
+            self._db.execute("BEGIN")
+            run = []
+            for row in rows + [None]:
+                if run and (row is None or row[1:3] != run[0][1:3] or len(run) == factor):
+                    if len(run) > 1:
+                        totals = {}
+                        for _, _, _, values, _ in run:
+                            for feed_key, value in json.loads(values).items():
+                                totals.setdefault(feed_key, []).append(value)
+                        averaged = {feed_key: sum(vals) / len(vals) for feed_key, vals in totals.items()}
+                        self._db.executemany("DELETE FROM outbox WHERE id = ?", [(entry[0],) for entry in run[:-1]])
+                        self._db.execute("UPDATE outbox SET feed_values = ? WHERE id = ?",
+                                         (json.dumps(averaged), run[-1][0]))
+                        merged += len(run) - 1
+                    run = []
+                if row is not None:
+                    run.append(row)
+            self._db.execute("COMMIT")
+            self._count -= merged
+        return merged
+
+    def prune(self, retention_seconds):
+        """Drop entries older than the retention period"""
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM outbox WHERE created < ?", (time.time() - retention_seconds,))
+            self._count -= cursor.rowcount
+        if cursor.rowcount:
+            logger.warning(f"Upload queue retention discarded {cursor.rowcount} reading(s)")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class UploadFlusher(Thread):
+    """Drains the upload queue in timestamp order whenever Adafruit IO is reachable.
+
+    Flushes are triggered by new readings and by timers on the retry scheduler;
+    failures back off with jitter behind the Adafruit IO circuit breaker.
+    """
+
+    def __init__(self, queue, settings, timer=None, batch_size=UPLOAD_BATCH_SIZE, interval=60,
+                 base_delay=5, max_retry_delay=300):
+        super().__init__(name='upload-flusher', daemon=True)
+        self.queue = queue
+        self.settings = settings
+        self.timer = timer
+        self.breaker = get_circuit_breaker('Adafruit IO')
+        self.batch_size = batch_size
+        self.interval = interval
+        self.base_delay = base_delay
+        self.max_retry_delay = max_retry_delay
+        self._wake = Event()
+        self._stopped = Event()
+        self._timer_lock = Lock()
+        self._timer_handle = None
+        self._timer_token = None
+        self._retry_at = 0.0
+        self.rate_wait = 0.0
+        self.failures = 0
+        self.uploaded = 0
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        self.join()
+
+    def _wake_in(self, delay):
+        with self._timer_lock:
+            if self._timer_handle is not None:
+                self.timer.cancel(self._timer_handle)
+            self._timer_token = token = object()
+            self._timer_handle = self.timer.schedule(delay, functools.partial(self._timer_fired, token))
+
+    def _timer_fired(self, token):
+        with self._timer_lock:
+            # A timer that fired just before being replaced must not forget its successor
+            if token is self._timer_token:
+                self._timer_handle = self._timer_token = None
+        self.wake()
+
+    @property
+    def limiter(self):
+        return get_rate_limiter(self.settings['ADAFRUIT_IO_USERNAME'], self.settings['ADAFRUIT_IO_RATE_LIMIT'])
+
+    def fit_backlog(self):
+        """Coalesce the queue if the account's data rate cannot deliver it within the backlog horizon"""
+        limiter = self.limiter
+        budget = limiter.rate * 60 * self.settings['UPLOAD_BACKLOG_HORIZON_MINUTES']
+        pending = self.queue.pending_points()
+        while pending > budget and len(self.queue) > 1:
+            factor = math.ceil(pending / budget)
+            merged = self.queue.coalesce(factor)
+            if not merged:
+                break  # One entry per sensor left; nothing more to average
+            limiter.coalesced += merged
+            ADAFRUIT_COALESCED.inc(merged)
+            logger.warning(f"Upload backlog of {pending} points exceeds the rate budget, "
+                           f"averaged every {factor} readings per sensor ({merged} merged)")
+            pending = self.queue.pending_points()
+
+    def flush(self):
+        """Upload queued entries oldest first.
+
+        Returns 'empty' when the queue is drained, 'rate-limited' when the account's
+        token bucket is spent, and 'failed' when an upload fails.
+        """
+        limiter = self.limiter
+        self.fit_backlog()
+        while not self._stopped.is_set():
+            entries = self.queue.oldest(self.batch_size)
+            if not entries:
+                return 'empty'
+
+            # Send as many of the oldest entries as the budget allows right now
+            available = limiter.available()
+            cost = 0
+            affordable = 0
+            for entry in entries:
+                if cost + len(entry[3]) > available:
+                    break
+                cost += len(entry[3])
+                affordable += 1
+            # Only ask the breaker once a request can go out, so a half-open probe is not spent waiting for budget
+            if affordable and not self.breaker.allow():
+                return 'failed'
+            if affordable == 0 or not limiter.try_consume(cost):
+                self.rate_wait = limiter.time_until(len(entries[0][3]))
+                return 'rate-limited'
+            entries = entries[:affordable]
+
+            throttled = limiter.throttled
+            if len(entries) == 1:
+                entry_id, _, group_name, values, created = entries[0]
+                sent = upload_to_adafruit(self.settings, group_name, values, format_created_at(created))
+                delivered = {(entry_id, feed_key) for feed_key in sent}
+            else:
+                delivered = send_backlog_to_adafruit(entries)
+            self.queue.complete(entries, delivered)
+            self.uploaded += len(delivered)
+            if len(delivered) < cost:
+                if limiter.throttled != throttled:
+                    # The server's rate limit, not an outage: wait for the budget to refill
+                    self.rate_wait = limiter.time_until(len(entries[0][3]))
+                    return 'rate-limited'
+                self.breaker.record_failure()
+                return 'failed'
+            self.breaker.record_success()
+        return 'empty'
+
+    def run(self):
+        self._wake.set()  # Replay anything left over from the last run right away
+        while not self._stopped.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stopped.is_set():
+                return
+            if time.monotonic() < self._retry_at:
+                continue  # Backing off: new readings wait on disk until the retry timer fires
+
+            try:
+                self.queue.prune(self.settings['UPLOAD_QUEUE_RETENTION_DAYS'] * 86400)
+                result = self.flush()
+            except Exception as e:
+                log_error(f"Error flushing upload queue: {e}")
+                result = 'failed'
+
+            if result == 'empty':
+                self.failures = 0
+                self._retry_at = 0.0
+                self._wake_in(self.interval)
+            elif result == 'rate-limited':
+                # Space the next request to fit the account's data rate
+                self._retry_at = time.monotonic() + self.rate_wait
+                logger.debug(f"Adafruit IO rate budget spent, next upload in {self.rate_wait:.1f}s")
+                self._wake_in(self.rate_wait)
+            else:
+                # Adafruit IO is unreachable: keep readings on disk and retry later
+                self.failures += 1
+                ADAFRUIT_RETRIES.inc()
+                delay = max(self.breaker.retry_in(),
+                            backoff_delay(self.failures, self.base_delay, self.max_retry_delay))
+                self._retry_at = time.monotonic() + delay
+                logger.warning(f"{len(self.queue)} reading(s) queued for upload, retrying in {delay:.0f}s")
+                self._wake_in(delay)
+
+
+def queue_upload(settings, definition, reading):
+    """Persist a reading for upload and nudge the flusher, or upload inline without a queue"""
+    values = reading_feed_values(definition, reading)
+    if upload_queue is None:
+        upload_to_adafruit(settings, settings['ADAFRUIT_IO_GROUP_NAME'], values, format_created_at(reading.timestamp))
+        return
+    upload_queue.put(reading.sensor_id, settings['ADAFRUIT_IO_GROUP_NAME'], values, reading.timestamp)
+    upload_flusher.wake()
+
+
+# Binary history: fixed-width little-endian records in memory-mapped segment files
+HISTORY_HEADER = struct.Struct('<4sHHIQ12x')  # magic, version, record size, capacity, record count
+HISTORY_RECORD = struct.Struct('<dIfff')  # timestamp, sensor index, temperature_c, humidity, co2
+HISTORY_COUNT_OFFSET = 12  # Byte offset of the record count inside the header
+HISTORY_MAGIC = b'SCDH'
+HISTORY_VERSION = 1
+HISTORY_SEGMENT_RECORDS = 65536
+
+if np is not None:
+    HISTORY_DTYPE = np.dtype([('timestamp', '<f8'), ('sensor', '<u4'), ('temperature_c', '<f4'),
+                              ('humidity', '<f4'), ('co2', '<f4')])
+
+
+class HistorySegment:
+    """One preallocated, memory-mapped segment file of fixed-width reading records"""
+
+    def __init__(self, path, capacity=HISTORY_SEGMENT_RECORDS):
+        self.path = path
+        if not os.path.exists(path):
+            with open(path, 'wb') as file:
+                file.write(HISTORY_HEADER.pack(HISTORY_MAGIC, HISTORY_VERSION, HISTORY_RECORD.size, capacity, 0))
+                file.truncate(HISTORY_HEADER.size + capacity * HISTORY_RECORD.size)
+        self._file = open(path, 'r+b')
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        magic, version, record_size, self.capacity, self.count = HISTORY_HEADER.unpack_from(self._mm)
+        if magic != HISTORY_MAGIC or version != HISTORY_VERSION or record_size != HISTORY_RECORD.size:
+            raise ValueError(f"{path} is not a version {HISTORY_VERSION} history segment")
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    def append(self, timestamp, sensor, temperature_c, humidity, co2):
+        HISTORY_RECORD.pack_into(self._mm, HISTORY_HEADER.size + self.count * HISTORY_RECORD.size,
+                                 timestamp, sensor, temperature_c, humidity, co2)
+        # Publish the record only after it is fully written
+        self.count += 1
+        struct.pack_into('<Q', self._mm, HISTORY_COUNT_OFFSET, self.count)
+
+    def timestamp_at(self, index):
+        return struct.unpack_from('<d', self._mm, HISTORY_HEADER.size + index * HISTORY_RECORD.size)[0]
+
+    def bisect(self, timestamp):
+        """Index of the first record at or after timestamp (records are appended in time order)"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp_at(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def view(self, start=0, stop=None):
+        """Zero-copy memoryview over records [start, stop)"""
+        stop = self.count if stop is None else stop
+        return memoryview(self._mm)[HISTORY_HEADER.size + start * HISTORY_RECORD.size:
+                                    HISTORY_HEADER.size + stop * HISTORY_RECORD.size]
+
+    def array(self, start=0, stop=None):
+        """Zero-copy NumPy structured array over records [start, stop)"""
+        stop = self.count if stop is None else stop
+        return np.frombuffer(self._mm, dtype=HISTORY_DTYPE, count=stop - start,
+                             offset=HISTORY_HEADER.size + start * HISTORY_RECORD.size)
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+class BinaryHistoryStore:
+    """Append-only reading history in memory-mapped, fixed-width segment files.
+
+    Views returned by scan()/arrays() point into the mapped files and are only
+    valid until the store is closed.
+    """
+
+    def __init__(self, directory=HISTORY_DIR, segment_records=HISTORY_SEGMENT_RECORDS):
+        self.directory = directory
+        self.segment_records = segment_records
+        self._lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._sensors_file = os.path.join(directory, 'sensors.json')
+        self.sensor_ids = []
+        if os.path.exists(self._sensors_file):
+            with open(self._sensors_file) as file:
+                self.sensor_ids = json.load(file)
+        self._sensor_index = {sensor_id: index for index, sensor_id in enumerate(self.sensor_ids)}
+
+        self.segments = [HistorySegment(os.path.join(directory, name))
+                         for name in sorted(os.listdir(directory)) if name.endswith('.seg')]
+        if not self.segments:
+            self._add_segment()
+
+    def _add_segment(self):
+        number = int(os.path.basename(self.segments[-1].path)[:6]) + 1 if self.segments else 0
+        path = os.path.join(self.directory, f"{number:06d}.seg")
+        self.segments.append(HistorySegment(path, self.segment_records))
+
+    def _sensor(self, sensor_id):
+        index = self._sensor_index.get(sensor_id)
+        if index is None:
+            index = self._sensor_index[sensor_id] = len(self.sensor_ids)
+            self.sensor_ids.append(sensor_id)
+            temp_file = self._sensors_file + '.tmp'
+            with open(temp_file, 'w') as file:
+                json.dump(self.sensor_ids, file)
+            os.replace(temp_file, self._sensors_file)
+        return index
+
+    def append(self, reading):
+        with self._lock:
+            if self.segments[-1].full:
+                self.segments[-1].flush()
+                self._add_segment()
+            self.segments[-1].append(reading.timestamp, self._sensor(reading.sensor_id),
+                                     reading.temperature_c, reading.humidity, reading.co2)
+
+    def _ranges(self, start=None, end=None):
+        """Yield (segment, first, stop) record ranges overlapping [start, end)"""
+        for segment in list(self.segments):
+            count = segment.count
+            if count == 0:
+                continue
+            if start is not None and segment.timestamp_at(count - 1) < start:
+                continue
+            if end is not None and segment.timestamp_at(0) >= end:
+                break
+            first = 0 if start is None else segment.bisect(start)
+            stop = count if end is None else min(count, segment.bisect(end))
+            if first < stop:
+                yield segment, first, stop
+
+    def scan(self, start=None, end=None):
+        """Yield Reading tuples with start <= timestamp < end, decoded straight from the mapped files"""
+        sensor_ids = self.sensor_ids
+        for segment, first, stop in self._ranges(start, end):
+            for timestamp, sensor, temperature_c, humidity, co2 in HISTORY_RECORD.iter_unpack(segment.view(first, stop)):
+                yield Reading(sensor_ids[sensor], timestamp, temperature_c, humidity, co2)
+
+    def arrays(self, start=None, end=None):
+        """Yield zero-copy NumPy structured arrays, one per segment, covering [start, end)"""
+        if np is None:
+            raise RuntimeError("NumPy is required for array views of the history store")
+        for segment, first, stop in self._ranges(start, end):
+            yield segment.array(first, stop)
+
+    def __len__(self):
+        return sum(segment.count for segment in self.segments)
+
+    def compact(self, archive):
+        """Move every full segment except the active one into a compressed archive; returns readings moved"""
+        moved = 0
+        while len(self.segments) > 1 and self.segments[0].full:
+            segment = self.segments[0]
+            by_sensor = {}
+            for timestamp, sensor, temperature_c, humidity, co2 in HISTORY_RECORD.iter_unpack(segment.view()):
+                by_sensor.setdefault(self.sensor_ids[sensor], []).append((timestamp, temperature_c, humidity, co2))
+            for sensor_id, rows in by_sensor.items():
+                archive.append(sensor_id, rows)
+            archive.flush()
+            # The archive is durable before the segment goes away
+            with self._lock:
+                self.segments.pop(0)
+            segment.close()
+            os.remove(segment.path)
+            moved += segment.count
+        if moved:
+            logger.info(f"Archived {moved} reading(s) from the binary history store")
+        return moved
+
+    def flush(self):
+        with self._lock:
+            self.segments[-1].flush()
+
+    def close(self):
+        with self._lock:
+            for segment in self.segments:
+                segment.flush()
+                segment.close()
+
+
+# Metrics kept in the history database, and its rollup tables (name -> bucket seconds)
+HISTORY_METRICS = ('temperature_c', 'humidity', 'co2')
+HISTORY_ROLLUPS = {'rollup_1m': 60, 'rollup_1h': 3600, 'rollup_1d': 86400}
+
+
+# Compressed archive blocks: delta-of-delta millisecond timestamps and XOR-encoded float32 values
+# (Gorilla, Pelkonen et al. 2015), one bit stream per column, behind a header indexing each block
+GORILLA_HEADER = struct.Struct('<4sHIdd6f4I')  # magic, sensor id length, count, first/last timestamp,
+                                                # min/max per metric, byte length of each column
+GORILLA_MAGIC = b'SCDG'
+GORILLA_BLOCK_RECORDS = 720  # One hour of readings at the SCD4x measurement period
+HISTORY_ARCHIVE_FILE = "archive.scdg"
+
+# Delta-of-delta buckets: (prefix, value bits); anything larger is stored as '1111' + 64 bits
+GORILLA_DOD_BUCKETS = (('10', 7), ('110', 9), ('1110', 12))
+
+
+def _pack_bits(bits):
+    bits += '0' * (-len(bits) % 8)
+    return int(bits, 2).to_bytes(len(bits) // 8, 'big') if bits else b''
+
+
+def _unpack_bits(data):
+    return format(int.from_bytes(data, 'big'), f'0{len(data) * 8}b')
+
+
+def encode_timestamps(timestamps):
+    """Encode ascending timestamps (seconds) as millisecond delta-of-deltas"""
+    if not timestamps:
+        return b''
+    previous = round(timestamps[0] * 1000)
+    bits = [format(previous & 0xFFFFFFFFFFFFFFFF, '064b')]
+    delta = 0
+    for timestamp in timestamps[1:]:
+        current = round(timestamp * 1000)
+        dod = current - previous - delta
+        delta, previous = current - previous, current
+        if dod == 0:
+            bits.append('0')
+            continue
+        for prefix, width in GORILLA_DOD_BUCKETS:
+            if -(1 << (width - 1)) <= dod < 1 << (width - 1):
+                bits.append(prefix + format(dod & ((1 << width) - 1), f'0{width}b'))
+                break
+        else:
+            bits.append('1111' + format(dod & 0xFFFFFFFFFFFFFFFF, '064b'))
+    return _pack_bits(''.join(bits))
+
+
+def decode_timestamps(data, count):
+    if not count:
+        return []
+    bits = _unpack_bits(data)
+    previous = int(bits[:64], 2)
+    values = [previous / 1000]
+    position, delta = 64, 0
+    for _ in range(count - 1):
+        if bits[position] == '0':
+            position += 1
+        else:
+            for prefix, width in GORILLA_DOD_BUCKETS + (('1111', 64),):
+                if bits.startswith(prefix, position):
+                    break
+            position += len(prefix)
+            dod = int(bits[position:position + width], 2)
+            if dod >= 1 << (width - 1):
+                dod -= 1 << width
+            position += width
+            delta += dod
+        previous += delta
+        values.append(previous / 1000)
+    return values
+
+
+def encode_floats(values):
+    """XOR-encode a column as float32: '0' repeats the previous value, '10' reuses the previous
+    leading/trailing-zero window, '11' + 5-bit leading zeros + 5-bit length opens a new one"""
+    if not values:
+        return b''
+    words = struct.unpack(f'<{len(values)}I', struct.pack(f'<{len(values)}f', *values))
+    previous = words[0]
+    bits = [format(previous, '032b')]
+    leading = trailing = None
+    for word in words[1:]:
+        xor = word ^ previous
+        previous = word
+        if not xor:
+            bits.append('0')
+            continue
+        zeros_before = 32 - xor.bit_length()
+        zeros_after = (xor & -xor).bit_length() - 1
+        if leading is not None and zeros_before >= leading and zeros_after >= trailing:
+            bits.append('10' + format(xor >> trailing, f'0{32 - leading - trailing}b'))
+        else:
+            leading, trailing = zeros_before, zeros_after
+            size = 32 - leading - trailing
+            bits.append(f'11{leading:05b}{size - 1:05b}' + format(xor >> trailing, f'0{size}b'))
+    return _pack_bits(''.join(bits))
+
+
+def decode_floats(data, count):
+    if not count:
+        return []
+    bits = _unpack_bits(data)
+    word = int(bits[:32], 2)
+    words = [word]
+    position, size, trailing = 32, 0, 0
+    for _ in range(count - 1):
+        if bits[position] == '0':
+            position += 1
+        else:
+            if bits[position + 1] == '0':
+                position += 2
+            else:
+                leading = int(bits[position + 2:position + 7], 2)
+                size = int(bits[position + 7:position + 12], 2) + 1
+                trailing = 32 - leading - size
+                position += 12
+            word ^= int(bits[position:position + size], 2) << trailing
+            position += size
+        words.append(word)
+    return list(struct.unpack(f'<{count}f', struct.pack(f'<{count}I', *words)))
+
+
+class ArchiveBlock(namedtuple('ArchiveBlock', ['offset', 'sensor_id', 'count', 'start', 'end',
+                                               'minimums', 'maximums', 'sizes'])):
+    """Index entry for one compressed block; minimums/maximums follow HISTORY_METRICS"""
+
+    def overlaps(self, start=None, end=None):
+        return (start is None or self.end >= start) and (end is None or self.start < end)
+
+    def may_contain(self, metric, low=None, high=None):
+        index = HISTORY_METRICS.index(metric)
+        return (low is None or self.maximums[index] >= low) and (high is None or self.minimums[index] <= high)
+
+
+def encode_block(sensor_id, rows):
+    """Encode (timestamp, temperature_c, humidity, co2) rows of one sensor, in time order, as a block"""
+    columns = list(zip(*rows))
+    payloads = [encode_timestamps(columns[0])] + [encode_floats(column) for column in columns[1:]]
+    # Bounds are taken after float32 rounding so they match the decoded values exactly
+    bounds = []
+    for column in columns[1:]:
+        rounded = struct.unpack(f'<{len(column)}f', struct.pack(f'<{len(column)}f', *column))
+        bounds += [min(rounded), max(rounded)]
+    name = sensor_id.encode()
+    header = GORILLA_HEADER.pack(GORILLA_MAGIC, len(name), len(rows), columns[0][0], columns[0][-1],
+                                 *bounds, *(len(payload) for payload in payloads))
+    return b''.join([header, name] + payloads)
+
+
+class CompressedHistoryArchive:
+    """Append-only file of compressed reading blocks.
+
+    Only block headers are read on open; scans skip blocks outside the time
+    range (or, for select(), outside the value range) without decoding them.
+    """
+
+    def __init__(self, path, block_records=GORILLA_BLOCK_RECORDS):
+        self.path = path
+        self.block_records = block_records
+        self.blocks = []
+        self._lock = Lock()
+        self._file = open(path, 'a+b')
+        self._file.seek(0)
+        offset = 0
+        while True:
+            header = self._file.read(GORILLA_HEADER.size)
+            if len(header) < GORILLA_HEADER.size:
+                break
+            magic, name_length, count, start, end, *fields = GORILLA_HEADER.unpack(header)
+            sizes = fields[6:]
+            name = self._file.read(name_length)
+            if magic != GORILLA_MAGIC or len(name) < name_length:
+                break
+            length = GORILLA_HEADER.size + name_length + sum(sizes)
+            if offset + length > os.fstat(self._file.fileno()).st_size:
+                break
+            self.blocks.append(ArchiveBlock(offset, name.decode(), count, start, end,
+                                            tuple(fields[0:6:2]), tuple(fields[1:6:2]), tuple(sizes)))
+            offset += length
+            self._file.seek(offset)
+        # Drop a torn block left by a crash mid-append
+        self._file.truncate(offset)
+
+    def append(self, sensor_id, rows):
+        """Append (timestamp, temperature_c, humidity, co2) rows of one sensor as one or more blocks"""
+        with self._lock:
+            for first in range(0, len(rows), self.block_records):
+                chunk = rows[first:first + self.block_records]
+                data = encode_block(sensor_id, chunk)
+                self._file.seek(0, os.SEEK_END)
+                offset = self._file.tell()
+                self._file.write(data)
+                magic, name_length, count, start, end, *fields = GORILLA_HEADER.unpack_from(data)
+                self.blocks.append(ArchiveBlock(offset, sensor_id, count, start, end,
+                                                tuple(fields[0:6:2]), tuple(fields[1:6:2]), tuple(fields[6:])))
+
+    def _decode(self, block, metrics=HISTORY_METRICS):
+        """Return the timestamp column and the requested metric columns of a block"""
+        with self._lock:
+            self._file.seek(block.offset + GORILLA_HEADER.size + len(block.sensor_id.encode()))
+            data = self._file.read(sum(block.sizes))
+        columns = {}
+        position = block.sizes[0]
+        timestamps = decode_timestamps(data[:position], block.count)
+        for metric, size in zip(HISTORY_METRICS, block.sizes[1:]):
+            if metric in metrics:
+                columns[metric] = decode_floats(data[position:position + size], block.count)
+            position += size
+        return timestamps, columns
+
+    def scan(self, start=None, end=None, sensor_id=None):
+        """Yield Reading tuples with start <= timestamp < end, block by block"""
+        for block in list(self.blocks):
+            if (sensor_id is not None and block.sensor_id != sensor_id) or not block.overlaps(start, end):
+                continue
+            timestamps, columns = self._decode(block)
+            for timestamp, temperature_c, humidity, co2 in zip(timestamps, *(columns[metric] for metric in HISTORY_METRICS)):
+                if (start is None or timestamp >= start) and (end is None or timestamp < end):
+                    yield Reading(block.sensor_id, timestamp, temperature_c, humidity, co2)
+
+    def select(self, metric, low=None, high=None, start=None, end=None, sensor_id=None):
+        """Yield (sensor_id, timestamp, value) where low <= value <= high, decoding only blocks whose
+        min/max index overlaps the range and only the timestamp and metric columns"""
+        for block in list(self.blocks):
+            if (sensor_id is not None and block.sensor_id != sensor_id) or not block.overlaps(start, end) \
+                    or not block.may_contain(metric, low, high):
+                continue
+            timestamps, columns = self._decode(block, (metric,))
+            for timestamp, value in zip(timestamps, columns[metric]):
+                if (low is None or value >= low) and (high is None or value <= high) \
+                        and (start is None or timestamp >= start) and (end is None or timestamp < end):
+                    yield block.sensor_id, timestamp, value
+
+    def __len__(self):
+        return sum(block.count for block in self.blocks)
+
+    def size(self):
+        with self._lock:
+            return os.fstat(self._file.fileno()).st_size
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._file.close()
+
+
+def rollup_partials(rows):
+    """Pre-aggregate (sensor_id, timestamp, *metrics) rows into {rollup table: {(sensor_id, bucket): partial}}.
+
+    A partial is [count, then min, max, sum of each metric], so each rollup row
+    is touched once per transaction. Only the finest rollup looks at every
+    row; each coarser one merges the partials of the one below it.
+    """
+    partials = {}
+    finer = None
+    for table, width in sorted(HISTORY_ROLLUPS.items(), key=lambda item: item[1]):
+        buckets = partials[table] = {}
+        if finer is None:
+            # Group first so min/max/sum run over whole columns instead of row by row
+            groups = {}
+            for row in rows:
+                key = (row[0], int(row[1] // width) * width)
+                group = groups.get(key)
+                if group is None:
+                    groups[key] = [row]
+                else:
+                    group.append(row)
+            for key, group in groups.items():
+                buckets[key] = [len(group)] + [stat for column in list(zip(*group))[2:]
+                                               for stat in (min(column), max(column), sum(column))]
+        else:
+            for (sensor_id, timestamp), (count, *stats) in finer.items():
+                key = (sensor_id, int(timestamp // width) * width)
+                partial = buckets.get(key)
+                if partial is None:
+                    buckets[key] = [count] + stats
+                else:
+                    partial[0] += count
+                    for base in range(1, len(partial), 3):
+                        if stats[base - 1] < partial[base]:
+                            partial[base] = stats[base - 1]
+                        if stats[base] > partial[base + 1]:
+                            partial[base + 1] = stats[base]
+                        partial[base + 2] += stats[base + 1]
+        finer = buckets
+    return partials
+
+
+class HistoryDatabase:
+    """SQLite (WAL) reading history with incrementally maintained 1-minute/1-hour/1-day rollups"""
+
+    def __init__(self, path=HISTORY_DB_FILE, batch_size=500):
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = Lock()
+        self._last_prune = None
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS import_progress (source TEXT PRIMARY KEY, offset INTEGER NOT NULL)")
+        self._db.execute(f"""
+            CREATE TABLE IF NOT EXISTS readings (
+                sensor_id TEXT NOT NULL,
+                ts REAL NOT NULL,
+                {', '.join(f'{metric} REAL' for metric in HISTORY_METRICS)}
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS readings_sensor_ts ON readings (sensor_id, ts)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS readings_ts ON readings (ts)")
+
+        columns = ', '.join(f"{metric}_min REAL, {metric}_max REAL, {metric}_sum REAL" for metric in HISTORY_METRICS)
+        for table in HISTORY_ROLLUPS:
+            self._db.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    sensor_id TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    {columns},
+                    PRIMARY KEY (sensor_id, bucket)
+                ) WITHOUT ROWID""")
+
+        # Merge a batch's partial aggregates into existing rollup rows
+        names = ['sensor_id', 'bucket', 'count'] + [f"{metric}_{stat}" for metric in HISTORY_METRICS
+                                                    for stat in ('min', 'max', 'sum')]
+        updates = ['count = count + excluded.count'] + [
+            f"{metric}_min = MIN({metric}_min, excluded.{metric}_min), "
+            f"{metric}_max = MAX({metric}_max, excluded.{metric}_max), "
+            f"{metric}_sum = {metric}_sum + excluded.{metric}_sum" for metric in HISTORY_METRICS]
+        self._upserts = {
+            table: f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+                   f"ON CONFLICT (sensor_id, bucket) DO UPDATE SET {', '.join(updates)}"
+            for table in HISTORY_ROLLUPS
+        }
+
+    def add(self, reading):
+        """Buffer a reading; it is written with the next commit()"""
+        with self._lock:
+            self._pending.append((reading.sensor_id, reading.timestamp, reading.temperature_c,
+                                  reading.humidity, reading.co2))
+            flush = len(self._pending) >= self.batch_size
+        if flush:
+            self.commit()
+
+    def add_many(self, rows):
+        """Write (sensor_id, timestamp, temperature_c, humidity, co2) rows in one transaction"""
+        with self._lock:
+            self._write(rows)
+
+    def import_chunk(self, source, offset, rows, partials=None):
+        """Write imported readings together with the byte offset the source has been read up to"""
+        with self._lock:
+            self._write(rows, (source, offset), partials)
+
+    def import_offset(self, source):
+        """Byte offset an earlier import of source reached, or 0"""
+        with self._lock:
+            row = self._db.execute("SELECT offset FROM import_progress WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else 0
+
+    def commit(self):
+        """Write all buffered readings and their rollup updates in one transaction"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            if rows:
+                self._write(rows)
+
+    def _write(self, rows, progress=None, partials=None):
+        if partials is None:
+            partials = rollup_partials(rows)
+
+        # IMMEDIATE takes the write lock up front, so the monitor and an importer queue instead of deadlocking
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.executemany(f"INSERT INTO readings VALUES ({', '.join('?' * (2 + len(HISTORY_METRICS)))})", rows)
+            for table, buckets in partials.items():
+                self._db.executemany(self._upserts[table], [key + tuple(partial) for key, partial in buckets.items()])
+            if progress is not None:
+                self._db.execute("INSERT OR REPLACE INTO import_progress VALUES (?, ?)", progress)
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def query(self, sensor_id, metric, start, end, resolution=None, max_rows=2000):
+        """Return (timestamp, min, max, avg, count) rows for a metric in [start, end).
+
+        Without a resolution ('raw' or a rollup table name) the finest one that
+        stays within max_rows is used.
+        """
+        if metric not in HISTORY_METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of: {', '.join(HISTORY_METRICS)}")
+        if resolution is None:
+            resolution = 'raw'
+            if (end - start) / SCD4X_MEASUREMENT_PERIOD > max_rows:
+                resolution = next((table for table, width in HISTORY_ROLLUPS.items()
+                                   if (end - start) / width <= max_rows), 'rollup_1d')
+
+        with self._lock:
+            if resolution == 'raw':
+                return self._db.execute(f"SELECT ts, {metric}, {metric}, {metric}, 1 FROM readings "
+                                        "WHERE sensor_id = ? AND ts >= ? AND ts < ? ORDER BY ts",
+                                        (sensor_id, start, end)).fetchall()
+            if resolution not in HISTORY_ROLLUPS:
+                raise ValueError(f"Unknown resolution '{resolution}'")
+            width = HISTORY_ROLLUPS[resolution]
+            return self._db.execute(f"SELECT bucket, {metric}_min, {metric}_max, {metric}_sum / count, count "
+                                    f"FROM {resolution} WHERE sensor_id = ? AND bucket >= ? AND bucket < ? "
+                                    "ORDER BY bucket", (sensor_id, int(start // width) * width, end)).fetchall()
+
+    def sensor_ids(self):
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT DISTINCT sensor_id FROM rollup_1d")]
+
+    def prune(self, raw_retention_days, minute_retention_days=None, force=False):
+        """Delete raw readings (and optionally 1-minute rollups) past retention; hourly and daily rollups stay.
+
+        Runs at most once per HISTORY_PRUNE_SECONDS unless forced.
+        """
+        if not force and self._last_prune is not None and time.monotonic() - self._last_prune < HISTORY_PRUNE_SECONDS:
+            return
+        self._last_prune = time.monotonic()
+        now = time.time()
+        with self._lock:
+            deleted = self._db.execute("DELETE FROM readings WHERE ts < ?",
+                                       (now - raw_retention_days * 86400,)).rowcount
+            if minute_retention_days:
+                # One primary-key range per sensor instead of a scan of every 1-minute rollup
+                sensor_ids = [row[0] for row in self._db.execute("SELECT DISTINCT sensor_id FROM rollup_1d")]
+                for sensor_id in sensor_ids:
+                    self._db.execute("DELETE FROM rollup_1m WHERE sensor_id = ? AND bucket < ?",
+                                     (sensor_id, now - minute_retention_days * 86400))
+        if deleted:
+            logger.info(f"History retention pruned {deleted} raw reading(s)")
+
+    def close(self):
+        self.commit()
+        with self._lock:
+            self._db.close()
+
+
+# Legacy sensor_readings.log lines, optionally followed by the " - Sensor: <id>" aggregate suffix
+SENSOR_LOG_LINE = re.compile(
+    rb"^(\d{4}-\d\d-\d\d \d\d):(\d\d):(\d\d) - [^\n]*? - Temperature: (-?[\d.]+)\xc2\xb0F, "
+    rb"Humidity: ([\d.]+)%, CO2: ([\d.]+)ppm(?: - Sensor: ([^\s]+))?", re.M)
+IMPORT_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def parse_sensor_log(data, sensor_id='main', hours=None):
+    """Parse a block of complete sensor log lines into history rows.
+
+    Lines without a sensor suffix are attributed to sensor_id; lines that do
+    not match the log format are skipped. hours caches the epoch of each
+    local 'YYYY-MM-DD HH' prefix across calls.
+    """
+    if hours is None:
+        hours = {}
+    rows = []
+    append = rows.append
+    for hour, minute, second, temp_f, humidity, co2, sensor in SENSOR_LOG_LINE.findall(data):
+        base = hours.get(hour)
+        if base is None:
+            base = hours[hour] = time.mktime(time.strptime(hour.decode(), '%Y-%m-%d %H'))
+        append((sensor.decode() if sensor else sensor_id, base + int(minute) * 60 + int(second),
+                (float(temp_f) - 32) * 5 / 9, float(humidity), float(co2)))
+    return rows
+
+
+def iter_log_chunks(path, offset=0, chunk_size=IMPORT_CHUNK_BYTES):
+    """Yield (end_offset, data) blocks of whole lines from path starting at a byte offset.
+
+    A trailing line without its newline is left for a later import to pick up.
+    """
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        carry = b''
+        while True:
+            block = file.read(chunk_size)
+            if not block:
+                return
+            data = carry + block
+            cut = data.rfind(b'\n') + 1
+            carry = data[cut:]
+            if cut:
+                offset += cut
+                yield offset, data[:cut]
+
+
+def parse_log_chunk(data, sensor_id='main'):
+    """Parse a block of log lines into (rows, rollup partials); the CPU-bound half of an import"""
+    rows = parse_sensor_log(data, sensor_id)
+    return rows, rollup_partials(rows)
+
+
+def parse_log_chunks(chunks, sensor_id='main', workers=1):
+    """Yield (path, end_offset, rows, partials) for (path, end_offset, data) chunks, in order.
+
+    With several workers the chunks are parsed in worker processes, a bounded
+    number ahead of the caller so memory stays flat on large files.
+    """
+    if workers <= 1:
+        for path, end, data in chunks:
+            yield (path, end) + parse_log_chunk(data, sensor_id)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for path, end, data in chunks:
+            pending.append((path, end, pool.submit(parse_log_chunk, data, sensor_id)))
+            if len(pending) > workers * 2:
+                path, end, future = pending.popleft()
+                yield (path, end) + future.result()
+        while pending:
+            path, end, future = pending.popleft()
+            yield (path, end) + future.result()
+
+
+def import_sensor_logs(paths, db_path=HISTORY_DB_FILE, sensor_id='main', workers=None, offset=None,
+                       chunk_size=IMPORT_CHUNK_BYTES):
+    """Stream sensor logs into the history database; returns {path: readings imported}.
+
+    Worker processes parse the chunks while this process is the only writer.
+    Each chunk is committed together with its end offset, so an interrupted
+    import resumes where it stopped. offset=None continues every file from its
+    recorded offset; pass 0 to re-import from the start.
+    """
+    workers = workers or os.cpu_count() or 1
+    history = HistoryDatabase(db_path)
+    counts = dict.fromkeys(paths, 0)
+    try:
+        starts = {}
+        for path in counts:
+            start = offset
+            if start is None:
+                start = history.import_offset(os.path.abspath(path))
+                if start > os.path.getsize(path):
+                    logger.warning(f"{path} is shorter than its recorded import offset, importing from the start")
+                    start = 0
+            starts[path] = start
+        chunks = ((path, end, data) for path, start in starts.items()
+                  for end, data in iter_log_chunks(path, start, chunk_size))
+        for path, end, rows, partials in parse_log_chunks(chunks, sensor_id, workers):
+            history.import_chunk(os.path.abspath(path), end, rows, partials)
+            counts[path] += len(rows)
+    finally:
+        history.close()
+    for path, imported in counts.items():
+        logger.info(f"Imported {imported} reading(s) from {path}")
+    return counts
+
+
+def import_sensor_log(path, db_path=HISTORY_DB_FILE, sensor_id='main', offset=None, chunk_size=IMPORT_CHUNK_BYTES,
+                      workers=1):
+    """Stream one sensor log into the history database; returns the number of readings imported"""
+    return import_sensor_logs([path], db_path, sensor_id, workers, offset, chunk_size)[path]
+
+
+@app.route('/')
+def home():
+    """Home page redirect to settings"""
+    return redirect('/settings')
+
+
+@app.route('/settings', methods=['GET', 'POST'])
+def settings_route():
+    """Handle settings page and form submission"""
+    if request.method == 'POST':
+        try:
+            action = request.form.get('action')
+            new_settings = {}
+
+            # Get current settings to determine types
+            current_settings = settings_cache.get()
+
+            # Process each setting with proper type conversion
+            for key, value in request.form.items():
+                if key == 'action':
+                    continue
+                try:
+                    if isinstance(current_settings[key], float):
+                        new_settings[key] = float(value)
+                    elif isinstance(current_settings[key], int):
+                        new_settings[key] = int(value)
+                    else:
+                        new_settings[key] = value.strip()  # Sanitize string inputs
+                except ValueError:
+                    return jsonify(error=f'Invalid value for {key}. Expected {type(current_settings[key]).__name__}'), 400
+
+            # Write the new settings to a candidate file and only put it in place if it is valid,
+            # so a bad value can never leave the monitor and this page unable to read the settings
+            with settings_write_lock:
+                config = configparser.ConfigParser()
+                config.read(settings_cache.conf_file)  # Keep [Sensor ...] and [Alert ...] sections intact
+                config['General'] = {str(k): str(v) for k, v in new_settings.items()}
+                candidate = settings_cache.conf_file + '.candidate'
+                write_config(config, candidate)
+                try:
+                    validate_conf_file(candidate)
+                except ValueError as e:
+                    os.remove(candidate)
+                    return jsonify(error=str(e)), 400
+                os.replace(candidate, settings_cache.conf_file)
+            # Apply the change to the running monitor now rather than at the next poll
+            if settings_watcher is not None:
+                settings_watcher.notify()
+
+            # Handle reboot action
+            if action == "reboot":
+                return reboot_system()
+
+            return jsonify(message='Settings updated successfully!'), 200
+
+        except Exception as e:
+            log_error(f"Settings update error: {e}")
+            return jsonify(error=f'Error updating settings: {str(e)}'), 500
+    else:
+        try:
+            current_settings = settings_cache.get()
+            return render_template('settings.html', settings=current_settings)
+        except Exception as e:
+            log_error(f"Error loading settings: {str(e)}")
+            return jsonify(error=f'Error loading settings: {str(e)}'), 500
+
+
+def reboot_system():
+    """Reboot the system securely using subprocess"""
+    try:
+        logger.info("System reboot requested")
+        os.system('sudo shutdown -r now')
+        return jsonify(message='System is rebooting...'), 200
+    except Exception as e:
+        log_error(f"Reboot failed: {e}")
+        return jsonify(error='Error: Failed to reboot system'), 500
+
+
+class StreamSubscription:
+    """One stream client's bounded event queue"""
+
+    def __init__(self, max_events=STREAM_QUEUE_SIZE):
+        self.max_events = max_events
+        self.closed = False
+        self._events = deque()
+        self._ready = Condition()
+
+    def offer(self, payload):
+        """Queue an encoded event without blocking; False if the client has fallen too far behind"""
+        with self._ready:
+            if self.closed or len(self._events) >= self.max_events:
+                return False
+            self._events.append(payload)
+            self._ready.notify()
+            return True
+
+    def next(self, timeout):
+        """Next encoded event, b'' if none arrived within timeout, or None once closed"""
+        with self._ready:
+            if not self._events and not self.closed:
+                self._ready.wait(timeout)
+            if self._events:
+                return self._events.popleft()
+            return None if self.closed else b''
+
+    def close(self):
+        with self._ready:
+            self.closed = True
+            self._events.clear()
+            self._ready.notify()
+
+
+class StreamBroadcaster:
+    """Fans events out to stream subscribers without ever blocking the publisher.
+
+    Every event is encoded once. A subscriber whose queue is full is closed
+    and removed rather than slowing down everyone else.
+    """
+
+    def __init__(self, max_clients=OPTIONAL_SETTINGS['STREAM_MAX_CLIENTS'][0], queue_size=STREAM_QUEUE_SIZE):
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.published = 0
+        self.dropped = 0
+        self._lock = Lock()
+        self._subscribers = ()  # Replaced, never mutated, so publish() can iterate without the lock
+
+    def subscribe(self):
+        """Return a new subscription, or None when max_clients are already connected"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                return None
+            subscription = StreamSubscription(self.queue_size)
+            self._subscribers += (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            self._subscribers = tuple(other for other in self._subscribers if other is not subscription)
+
+    def publish(self, event, data):
+        subscribers = self._subscribers
+        if not subscribers:
+            return
+        payload = f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+        self.published += 1
+        for subscription in subscribers:
+            if not subscription.offer(payload) and not subscription.closed:
+                self.dropped += 1
+                logger.warning("Dropped a stream subscriber that stopped reading")
+                self.unsubscribe(subscription)
+
+    def close(self):
+        for subscription in self._subscribers:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        return {'subscribers': len(self._subscribers), 'published': self.published, 'dropped': self.dropped}
+
+
+stream_broadcaster = StreamBroadcaster()
+
+
+class LatestSnapshot(namedtuple('LatestSnapshot', ['etag', 'body'])):
+    """Immutable /api/latest response: serialised JSON and its content hash"""
+
+
+def publish_latest(reading=None):
+    """Record a reading (if given) and rebuild the /api/latest document from the latest readings and alert states.
+
+    Readers pick up the new snapshot through a single reference swap, so
+    requests never see a half-built document or touch a lock. The reading and
+    any alert state changes are also sent to stream subscribers.
+    """
+    global latest_snapshot
+    with latest_lock:
+        if reading is not None:
+            latest_readings[reading.sensor_id] = reading
+        sensors = {}
+        for sensor_id, latest in sorted(latest_readings.items()):
+            sensors[sensor_id] = {
+                'timestamp': latest.timestamp,
+                'temperature_c': round(latest.temperature_c, 2),
+                'temperature_f': round(latest.temperature_f, 2),
+                'humidity': round(latest.humidity, 2),
+                'co2': latest.co2,
+                'alerts': dict(alert_states.get(sensor_id, {})),
+            }
+        body = json.dumps({'sensors': sensors}, separators=(',', ':')).encode()
+        latest_snapshot = LatestSnapshot(hashlib.blake2b(body, digest_size=8).hexdigest(), body)
+
+        if reading is not None:
+            stream_broadcaster.publish('reading', dict(sensors[reading.sensor_id], sensor=reading.sensor_id))
+        for sensor_id, states in alert_states.items():
+            published = published_alert_states.setdefault(sensor_id, {})
+            for name, active in states.items():
+                if published.get(name, False) != active:
+                    published[name] = active
+                    stream_broadcaster.publish('alert', {'sensor': sensor_id, 'alert': name, 'active': active,
+                                                         'timestamp': time.time()})
+
+
+@app.route('/api/latest')
+def latest_route():
+    """Most recent reading and alert states per sensor; supports If-None-Match"""
+    snapshot = latest_snapshot
+    if snapshot is None:
+        return jsonify(error='No reading available yet'), 503
+    headers = {'ETag': f'"{snapshot.etag}"', 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains(snapshot.etag):
+        return Response(status=304, headers=headers)
+    return Response(snapshot.body, mimetype='application/json', headers=headers)
+
+
+@app.route('/api/stream')
+def stream_route():
+    """Server-Sent Events: the current snapshot as 'latest', then 'reading' and 'alert' events as they happen"""
+    subscription = stream_broadcaster.subscribe()
+    if subscription is None:
+        return jsonify(error='Too many stream subscribers'), 503
+
+    def events():
+        try:
+            snapshot = latest_snapshot
+            if snapshot is not None:
+                yield b'event: latest\ndata: ' + snapshot.body + b'\n\n'
+            while not shutdown_event.is_set():
+                payload = subscription.next(STREAM_HEARTBEAT_SECONDS)
+                if payload is None:
+                    return
+                # A comment line keeps idle connections open and detects clients that went away
+                yield payload or b': keep-alive\n\n'
+        finally:
+            stream_broadcaster.unsubscribe(subscription)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def render_gauge(name, description, samples):
+    """Exposition lines for a gauge from (labels dict, value) samples"""
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return lines
+
+
+@app.route('/metrics')
+def metrics_route():
+    """Prometheus text exposition of the latest readings, alert states, queue depths and hot-path metrics"""
+    with latest_lock:
+        readings = dict(latest_readings)
+    states = {sensor_id: dict(sensor_states) for sensor_id, sensor_states in list(alert_states.items())}
+    lines = []
+    for name, description, field in (('scd4x_temperature_celsius', "Latest temperature", 'temperature_c'),
+                                     ('scd4x_humidity_percent', "Latest relative humidity", 'humidity'),
+                                     ('scd4x_co2_ppm', "Latest CO2 concentration", 'co2'),
+                                     ('scd4x_reading_timestamp_seconds', "Time of the latest reading", 'timestamp')):
+        lines += render_gauge(name, description, [({'sensor': sensor_id}, getattr(reading, field))
+                                                  for sensor_id, reading in sorted(readings.items())])
+    lines += render_gauge('alert_active', "Whether an alert is currently raised",
+                          [({'sensor': sensor_id, 'alert': name}, int(active))
+                           for sensor_id, sensor_states in sorted(states.items())
+                           for name, active in sensor_states.items()])
+    dispatcher, queue = alert_dispatcher, upload_queue
+    if dispatcher is not None:
+        lines += render_gauge('alert_queue_depth', "Slack alerts waiting for delivery", [({}, dispatcher.depth)])
+    if queue is not None:
+        lines += render_gauge('upload_queue_entries', "Readings waiting for upload to Adafruit IO", [({}, len(queue))])
+    lines += render_gauge('stream_subscribers', "Connected /api/stream clients",
+                          [({}, stream_broadcaster.stats()['subscribers'])])
+    for metric in metrics_registry:
+        lines += metric.render()
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def lttb(x, y, points):
+    """Largest-Triangle-Three-Buckets downsampling: indices of `points` samples that keep the shape of (x, y).
+
+    The first and last samples are always kept. Each bucket in between keeps
+    the sample forming the largest triangle with the previously kept sample
+    and the mean of the next bucket. Bucket means come from one reduceat
+    pass; only the per-bucket argmax loops in Python.
+    """
+    count = len(x)
+    if points >= count or points < 3:
+        return np.arange(count) if points >= count else np.array([0, count - 1][:points], dtype=int)
+    edges = np.linspace(1, count - 1, points - 1).astype(int)
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[:count - 1], edges[:-1]) / sizes
+    mean_y = np.add.reduceat(y[:count - 1], edges[:-1]) / sizes
+    # The point after each bucket is the next bucket's mean, or the last sample for the final bucket
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(points, dtype=int)
+    selected[0], selected[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(points - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        areas = np.abs((ax - next_x[bucket]) * (y[low:high] - ay) - (ax - x[low:high]) * (next_y[bucket] - ay))
+        previous = low + int(areas.argmax())
+        selected[bucket + 1] = previous
+    return selected
+
+
+def parse_time_argument(value, default):
+    """Epoch seconds or an ISO 8601 timestamp (local time unless it carries an offset)"""
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+@app.route('/api/history')
+def history_route():
+    """Downsampled history of one metric: ?metric=&from=&to=&points=N&sensor=&format=json|binary.
+
+    The binary format is little-endian float32 (seconds after X-Time-Origin,
+    value) pairs.
+    """
+    database = history_db
+    if database is None:
+        return jsonify(error='History database is not enabled'), 503
+    try:
+        metric = request.args.get('metric', 'co2')
+        if metric not in HISTORY_METRICS:
+            raise ValueError(f"metric must be one of: {', '.join(HISTORY_METRICS)}")
+        end = parse_time_argument(request.args.get('to'), time.time())
+        start = parse_time_argument(request.args.get('from'), end - 86400)
+        # Finite and small enough for the rollup bucket numbers to fit SQLite integers
+        if not all(math.isfinite(value) and abs(value) < 1e15 for value in (start, end)):
+            raise ValueError("'from' and 'to' must be finite epoch seconds or ISO 8601 times")
+        points = int(request.args.get('points', 1000))
+        if not 2 <= points <= HISTORY_API_MAX_POINTS:
+            raise ValueError(f"points must be between 2 and {HISTORY_API_MAX_POINTS}")
+        if end <= start:
+            raise ValueError("'to' must be after 'from'")
+        output = request.args.get('format') or (
+            'binary' if request.accept_mimetypes.best == 'application/octet-stream' else 'json')
+        if output not in ('json', 'binary'):
+            raise ValueError("format must be 'json' or 'binary'")
+        sensor_id = request.args.get('sensor')
+        if sensor_id is None:
+            sensor_ids = database.sensor_ids()
+            sensor_id = 'main' if 'main' in sensor_ids or not sensor_ids else sensor_ids[0]
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    # The finest resolution with at most HISTORY_API_OVERSAMPLE rows per point feeds the downsampler;
+    # without NumPy the rollup with at most `points` rows is returned as is
+    oversample = HISTORY_API_OVERSAMPLE if np is not None else 1
+    rows = database.query(sensor_id, metric, start, end, max_rows=points * oversample)
+    if np is not None:
+        x = np.fromiter((row[0] for row in rows), dtype=np.float64, count=len(rows))
+        y = np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows))
+        if len(rows) > points:
+            keep = lttb(x, y, points)
+            x, y = x[keep], y[keep]
+        if output == 'binary':
+            body = np.column_stack((x - start, y)).astype('<f4').tobytes()
+        timestamps, values = x.tolist(), y.tolist()
+    else:
+        timestamps = [row[0] for row in rows]
+        values = [row[3] for row in rows]
+        if output == 'binary':
+            pairs = [number for pair in zip((timestamp - start for timestamp in timestamps), values) for number in pair]
+            body = struct.pack(f'<{len(pairs)}f', *pairs)
+
+    if output == 'binary':
+        return Response(body, mimetype='application/octet-stream',
+                        headers={'X-Time-Origin': repr(start), 'X-Points': str(len(timestamps))})
+    return jsonify(sensor=sensor_id, metric=metric, start=start, end=end, timestamps=timestamps, values=values)
+
+
+# SCD4x command words used by the frame reader
+SCD4X_CMD_READ_MEASUREMENT = 0xEC05
+
+
+def _build_crc8_table(polynomial=0x31):
+    """Precompute the Sensirion CRC-8 (poly 0x31) for every byte value"""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ polynomial) if crc & 0x80 else (crc << 1)
+        table.append(crc & 0xFF)
+    return bytes(table)
+
+
+SCD4X_CRC8_TABLE = _build_crc8_table()
+
+
+class Reading(namedtuple('Reading', ['sensor_id', 'timestamp', 'temperature_c', 'humidity', 'co2'])):
+    """One decoded SCD4x measurement"""
+    __slots__ = ()
+
+    @property
+    def temperature_f(self):
+        return celsius_to_fahrenheit(self.temperature_c)
+
+
+def decode_measurement_frame(frame):
+    """Check CRCs and decode a 9-byte read_measurement frame into (co2, temperature_c, humidity)"""
+    table = SCD4X_CRC8_TABLE
+    for i in (0, 3, 6):
+        if table[table[0xFF ^ frame[i]] ^ frame[i + 1]] != frame[i + 2]:
+            raise RuntimeError("CRC check failed while reading data")
+    co2 = (frame[0] << 8) | frame[1]
+    temperature_c = -45 + 175 * (((frame[3] << 8) | frame[4]) / 65536)
+    humidity = 100 * (((frame[6] << 8) | frame[7]) / 65536)
+    return co2, temperature_c, humidity
+
+
+class FrameSCD4X(adafruit_scd4x.SCD4X):
+    """SCD4x driver that reads CO2, temperature and humidity in one read_measurement transaction"""
+
+    def __init__(self, i2c_bus, address=0x62):
+        self.transactions = 0
+        self.frames = 0
+        self._frame = bytearray(9)
+        super().__init__(i2c_bus, address)
+
+    def _send_command(self, cmd, cmd_delay=0):
+        self.transactions += 1
+        I2C_TRANSACTIONS.inc()
+        super()._send_command(cmd, cmd_delay)
+
+    def _read_reply(self, buff, num):
+        self.transactions += 1
+        I2C_TRANSACTIONS.inc()
+        super()._read_reply(buff, num)
+
+    def read_frame(self, check_ready=True):
+        """Return (co2, temperature_c, humidity) from one frame, or None if no new data is ready"""
+        if check_ready:
+            start = time.perf_counter()
+            ready = self.data_ready
+            DATA_READY_SECONDS.observe(time.perf_counter() - start)
+            DATA_READY_POLLS.inc(labels=('true' if ready else 'false',))
+            if not ready:
+                return None
+        self._send_command(SCD4X_CMD_READ_MEASUREMENT, cmd_delay=0.001)
+        with self.i2c_device as i2c:
+            i2c.readinto(self._frame)
+        self.transactions += 1
+        self.frames += 1
+        I2C_TRANSACTIONS.inc()
+        FRAMES_READ.inc()
+        start = time.perf_counter()
+        try:
+            return decode_measurement_frame(self._frame)
+        except RuntimeError:
+            DECODE_ERRORS.inc()
+            raise
+        finally:
+            DECODE_SECONDS.observe(time.perf_counter() - start)
+
+
+def open_i2c_bus(scl, sda):
+    """Open an I2C bus on the given pins"""
+    return busio.I2C(scl, sda)
+
+
+def open_sensors(definitions):
+    """Initialize every configured SCD4x, sharing buses and multiplexers between sensors"""
+    buses = {}
+    muxes = {}
+    devices = []
+
+    for definition in definitions:
+        try:
+            bus = buses.get(definition['bus'])
+            if bus is None:
+                bus = buses[definition['bus']] = open_i2c_bus(definition['scl'], definition['sda'])
+
+            if definition['mux_address'] is not None:
+                # Only needed for multiplexed setups, so import lazily
+                import adafruit_tca9548a
+                mux_key = (definition['bus'], definition['mux_address'])
+                if mux_key not in muxes:
+                    muxes[mux_key] = adafruit_tca9548a.TCA9548A(bus, address=definition['mux_address'])
+                bus = muxes[mux_key][definition['mux_channel']]
+
+            sensor = FrameSCD4X(bus)
+            sensor.start_periodic_measurement()
+            devices.append((definition, sensor))
+            logger.info(f"SCD4X sensor '{definition['id']}' initialized on bus {definition['bus']}")
+        except Exception as e:
+            log_error(f"Failed to initialize sensor '{definition['id']}': {e}")
+
+    return devices
+
+
+def read_sensor(sensor_id, sensor):
+    """Read one measurement frame from a sensor, or None if no new data is ready"""
+    frame = sensor.read_frame()
+    if frame is None:
+        return None
+    co2, temperature_c, humidity = frame
+    return Reading(sensor_id, time.time(), temperature_c, humidity, co2)
+
+
+class Aggregate(namedtuple('Aggregate', ['sensor_id', 'start', 'end', 'count', 'last', 'min', 'max', 'mean'])):
+    """Summary of every frame a sensor produced in one reporting interval.
+
+    last, min, max and mean are Reading tuples holding the per-metric statistic.
+    """
+    __slots__ = ()
+
+
+class IntervalAggregator:
+    """Streams readings into running min/max/sum/last in constant memory"""
+
+    def __init__(self, sensor_id):
+        self.sensor_id = sensor_id
+        self.count = 0
+        self.start = None
+        self.last = None
+        self.minimum = None
+        self.maximum = None
+        self.sums = [0.0, 0.0, 0.0]
+
+    def add(self, reading):
+        values = reading[2:]  # temperature_c, humidity, co2
+        if self.count == 0:
+            self.start = reading.timestamp
+            self.minimum = list(values)
+            self.maximum = list(values)
+        else:
+            for i, value in enumerate(values):
+                if value < self.minimum[i]:
+                    self.minimum[i] = value
+                elif value > self.maximum[i]:
+                    self.maximum[i] = value
+        for i, value in enumerate(values):
+            self.sums[i] += value
+        self.count += 1
+        self.last = reading
+
+    def result(self):
+        """Return the Aggregate for the samples seen so far, or None if there were none"""
+        if self.count == 0:
+            return None
+        end = self.last.timestamp
+        return Aggregate(
+            self.sensor_id, self.start, end, self.count, self.last,
+            Reading(self.sensor_id, end, *self.minimum),
+            Reading(self.sensor_id, end, *self.maximum),
+            Reading(self.sensor_id, end, *(total / self.count for total in self.sums)),
+        )
+
+
+class SensorBusWorker(Thread):
+    """Continuously polls the sensors that share one physical I2C bus"""
+
+    def __init__(self, bus_key, devices, engine):
+        super().__init__(name=f"i2c-{bus_key}", daemon=True)
+        self.bus_key = bus_key
+        self.devices = devices
+        self.engine = engine
+        self.stopped = Event()
+        self.sweeps = 0
+        self.sweep_seconds = 0.0
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        # After a frame a sensor is next polled one measurement period later, and
+        # only polled every poll_interval while it reports that data is not ready
+        due = [0.0] * len(self.devices)
+        while not self.stopped.is_set():
+            started = time.monotonic()
+            for index, (definition, sensor) in enumerate(self.devices):
+                polled = time.monotonic()
+                if polled < due[index]:
+                    continue
+                due[index] = polled + self.engine.poll_interval
+                try:
+                    reading = read_sensor(definition['id'], sensor)
+                except Exception as e:
+                    log_error(f"Error reading sensor '{definition['id']}' on bus {self.bus_key}: {e}")
+                    continue
+                if reading is not None:
+                    due[index] = polled + self.engine.measurement_period
+                    self.engine.add(reading)
+            self.sweep_seconds = time.monotonic() - started
+            self.sweeps += 1
+            self.stopped.wait(max(0.0, min(due) - time.monotonic()))
+
+
+class AcquisitionEngine:
+    """Drives many sensors with one polling worker per I2C bus and aggregates every frame"""
+
+    def __init__(self, devices, poll_interval=SENSOR_POLL_INTERVAL, measurement_period=SCD4X_MEASUREMENT_PERIOD,
+                 on_reading=None):
+        self.devices = devices
+        self.on_reading = on_reading
+        self.definitions = {definition['id']: definition for definition, _ in devices}
+        self.poll_interval = poll_interval
+        self.measurement_period = measurement_period
+        self.workers = {}
+        self._lock = Lock()
+        self._aggregators = {sensor_id: IntervalAggregator(sensor_id) for sensor_id in self.definitions}
+
+        for definition, sensor in devices:
+            worker = self.workers.get(definition['bus'])
+            if worker is None:
+                worker = self.workers[definition['bus']] = SensorBusWorker(definition['bus'], [], self)
+            worker.devices.append((definition, sensor))
+
+    @property
+    def sensor_ids(self):
+        return set(self.definitions)
+
+    def transactions_per_reading(self):
+        """Average I2C transactions spent per decoded reading across all sensors"""
+        transactions = sum(getattr(sensor, 'transactions', 0) for _, sensor in self.devices)
+        frames = sum(getattr(sensor, 'frames', 0) for _, sensor in self.devices)
+        return transactions / frames if frames else 0.0
+
+    def add(self, reading):
+        with self._lock:
+            self._aggregators[reading.sensor_id].add(reading)
+        if self.on_reading is not None:
+            try:
+                self.on_reading(reading)
+            except Exception as e:
+                log_error(f"Error storing reading from sensor '{reading.sensor_id}': {e}")
+
+    def collect(self, wanted=None):
+        """Close the current interval for the wanted sensors and return (definition, Aggregate) pairs.
+
+        Sensors that have not produced a frame yet keep their (empty) interval open.
+        """
+        collected = []
+        with self._lock:
+            for sensor_id in (self.definitions if wanted is None else wanted):
+                aggregate = self._aggregators[sensor_id].result()
+                if aggregate is not None:
+                    self._aggregators[sensor_id] = IntervalAggregator(sensor_id)
+                    collected.append((self.definitions[sensor_id], aggregate))
+        return collected
+
+    def update_definitions(self, definitions):
+        """Apply new locations and feed names in place; returns the ids whose hardware setup changed"""
+        hardware = ('bus', 'mux_address', 'mux_channel')
+        changed = set(self.definitions) ^ {definition['id'] for definition in definitions}
+        with self._lock:
+            for definition in definitions:
+                current = self.definitions.get(definition['id'])
+                if current is None:
+                    continue
+                if any(current[key] != definition[key] for key in hardware):
+                    changed.add(definition['id'])
+                else:
+                    current.update((key, value) for key, value in definition.items() if key not in hardware)
+        return changed
+
+    def start(self):
+        for worker in self.workers.values():
+            worker.start()
+
+    def stop(self):
+        for worker in self.workers.values():
+            worker.stop()
+
+
+class DeadlineScheduler:
+    """Wakes on a fixed grid of monotonic deadlines aligned to wall-clock interval boundaries"""
+
+    def __init__(self, interval, event, immediate=True):
+        self.event = event
+        self.ticks = 0
+        self.skipped = 0
+        self.last_jitter = 0.0
+        self.max_jitter = 0.0
+        self._wake = Event()
+        self._anchor(interval)
+        self._immediate = immediate
+
+    def _anchor(self, interval):
+        # Anchor the grid so that ticks land on local boundaries (e.g. :00, :05),
+        # then follow the monotonic clock so wall-clock jumps cannot shift it
+        wall = time.time()
+        phase = (wall + time.localtime(wall).tm_gmtoff) % interval
+        self.interval = interval
+        self.next_deadline = time.monotonic() + (interval - phase)
+
+    def reschedule(self, interval):
+        """Move to a new interval grid, waking a wait() in progress"""
+        self._anchor(interval)
+        self._wake.set()
+
+    def interrupt(self):
+        """Wake a wait() in progress so it notices shutdown"""
+        self._wake.set()
+
+    def wait(self):
+        """Sleep until the next deadline; return False once shutdown is requested.
+
+        event is checked whenever the wait ends; a thread that sets it should
+        call interrupt() to end the wait early.
+        """
+        if self._immediate:
+            self._immediate = False
+            return not self.event.is_set()
+
+        while True:
+            timeout = self.next_deadline - time.monotonic()
+            if self.event.is_set():
+                return False
+            if timeout <= 0:
+                break
+            if self._wake.wait(timeout):
+                # Rescheduled or interrupted: re-check shutdown and the (possibly new) deadline
+                self._wake.clear()
+
+        # Skip deadlines we slept through instead of firing them back to back
+        lateness = time.monotonic() - self.next_deadline
+        missed = int(lateness // self.interval)
+        if missed:
+            self.skipped += missed
+            logger.warning(f"Scheduler skipped {missed} tick(s)")
+        jitter = lateness - missed * self.interval
+        self.next_deadline += (missed + 1) * self.interval
+
+        self.ticks += 1
+        self.last_jitter = jitter
+        self.max_jitter = max(self.max_jitter, jitter)
+        logger.debug(f"Tick {self.ticks}: jitter {jitter * 1000:.1f} ms (max {self.max_jitter * 1000:.1f} ms, skipped {self.skipped})")
+        return True
+
+
+def select_alert_values(aggregate, mode):
+    """Return the (high-check, low-check) Readings used for alerting"""
+    if mode == 'mean':
+        return aggregate.mean, aggregate.mean
+    if mode == 'extreme':
+        return aggregate.max, aggregate.min
+    return aggregate.last, aggregate.last
+
+
+class SlidingWindow:
+    """Count, mean, variance, min and max of the samples from the last `seconds`, in constant memory.
+
+    Samples live in a ring buffer sized for one window of SCD4x measurements;
+    when frames arrive faster than that the oldest samples are dropped early.
+    Running sums (shifted by an early sample to keep them small) give the mean
+    and variance, and monotonic deques give the min and max, so add() and
+    expire() are amortised O(1) whatever the window length.
+    """
+
+    def __init__(self, seconds, capacity=None):
+        self.seconds = seconds
+        self.capacity = capacity or math.ceil(seconds / SCD4X_MEASUREMENT_PERIOD) + 1
+        self._times = [0.0] * self.capacity
+        self._values = [0.0] * self.capacity
+        self._first = 0  # Sequence numbers of the oldest sample and of the next one
+        self._next = 0
+        self._shift = None
+        self._sum = self._sum_sq = 0.0
+        self._minima = deque()  # (sequence, value), values increasing
+        self._maxima = deque()  # (sequence, value), values decreasing
+
+    @property
+    def count(self):
+        return self._next - self._first
+
+    def add(self, timestamp, value):
+        if value != value:  # NaN
+            return
+        if self._next - self._first == self.capacity:
+            self._evict()
+        if self._shift is None:
+            self._shift = value
+        slot = self._next % self.capacity
+        self._times[slot] = timestamp
+        self._values[slot] = value
+        shifted = value - self._shift
+        self._sum += shifted
+        self._sum_sq += shifted * shifted
+        while self._minima and self._minima[-1][1] >= value:
+            self._minima.pop()
+        self._minima.append((self._next, value))
+        while self._maxima and self._maxima[-1][1] <= value:
+            self._maxima.pop()
+        self._maxima.append((self._next, value))
+        self._next += 1
+        self.expire(timestamp)
+
+    def expire(self, now):
+        """Drop samples that are `seconds` or more older than now"""
+        cutoff = now - self.seconds
+        while self._first < self._next and self._times[self._first % self.capacity] <= cutoff:
+            self._evict()
+
+    def _evict(self):
+        shifted = self._values[self._first % self.capacity] - self._shift
+        self._sum -= shifted
+        self._sum_sq -= shifted * shifted
+        if self._minima[0][0] == self._first:
+            self._minima.popleft()
+        if self._maxima[0][0] == self._first:
+            self._maxima.popleft()
+        self._first += 1
+        if self._first == self._next:
+            self._shift = None
+            self._sum = self._sum_sq = 0.0
+        elif self._first % self.capacity == 0:
+            self._rebase()
+
+    def _rebase(self):
+        # Once per trip around the ring (amortised O(1)): re-centre the sums on
+        # the oldest sample so rounding errors and a drifting level never build up
+        self._shift = self._values[self._first % self.capacity]
+        self._sum = self._sum_sq = 0.0
+        for sequence in range(self._first, self._next):
+            shifted = self._values[sequence % self.capacity] - self._shift
+            self._sum += shifted
+            self._sum_sq += shifted * shifted
+
+    def statistic(self, name):
+        """mean, min, max or stddev (population) of the window, NaN while it is empty"""
+        count = self._next - self._first
+        if not count:
+            return math.nan
+        if name == 'min':
+            return self._minima[0][1]
+        if name == 'max':
+            return self._maxima[0][1]
+        mean = self._sum / count
+        if name == 'mean':
+            return self._shift + mean
+        return math.sqrt(max(self._sum_sq / count - mean * mean, 0.0))
+
+
+class AlertRuleEngine:
+    """Alert rules compiled into a flat table with one entry per (sensor, rule) pair.
+
+    evaluate() checks every pair of the sensors that reported in a single pass:
+    a rule fires after `count` consecutive readings past its threshold and
+    clears once the value is back past the threshold by `hysteresis`. Tables of
+    ALERT_VECTOR_MIN_PAIRS pairs or more are evaluated with NumPy, if installed.
+    Windowed rules test a SlidingWindow statistic fed with every frame by add()
+    instead of the interval value. Raised alerts are mirrored into `states`
+    (sensor ID -> rule name -> bool).
+    """
+
+    def __init__(self, rules, sensor_ids, states=None):
+        self.states = alert_states if states is None else states
+        self.keys = []
+        self.windows = {}
+        self._lock = Lock()
+        self.compile(rules, sensor_ids)
+
+    def compile(self, rules, sensor_ids):
+        """Rebuild the table; pairs that survive keep their counter, alert state and window samples"""
+        with self._lock:
+            self._compile(rules, sensor_ids)
+
+    def _compile(self, rules, sensor_ids):
+        previous = dict(zip(self.keys, zip(list(self.counters), list(self.active)))) if self.keys else {}
+        previous_windows, self.windows = self.windows, {}
+
+        self.sensor_ids = list(sensor_ids)
+        self.rows = {sensor_id: row for row, sensor_id in enumerate(self.sensor_ids)}
+        self.rules, self.keys, self.starts, self.pair_windows = [], [], [0], []
+        sensor, metric, low, sign, inclusive, threshold, clear, count, counters, active = ([] for _ in range(10))
+        for sensor_id in self.sensor_ids:
+            for rule in rules:
+                if rule.sensors is not None and sensor_id not in rule.sensors:
+                    continue
+                direction = 1 if rule.comparator[0] == '>' else -1
+                self.rules.append(rule)
+                self.keys.append((sensor_id, rule.name))
+                sensor.append(self.rows[sensor_id])
+                metric.append(ALERT_METRICS.index(rule.metric))
+                low.append(int(direction < 0))
+                sign.append(direction)
+                inclusive.append(rule.comparator.endswith('='))
+                threshold.append(rule.threshold)
+                clear.append(rule.threshold - direction * rule.hysteresis)
+                count.append(rule.count)
+                state = previous.get((sensor_id, rule.name), (0, False))
+                counters.append(int(state[0]))
+                active.append(bool(state[1]))
+                window = None
+                if rule.window:
+                    # Rules over the same metric and window length share one window
+                    key = (sensor_id, rule.metric, rule.window)
+                    if key not in self.windows:
+                        self.windows[key] = previous_windows.pop(key, None) or SlidingWindow(rule.window)
+                    window = (self.windows[key], rule.statistic)
+                self.pair_windows.append(window)
+            self.starts.append(len(self.keys))
+        self.sensor_windows = {}
+        for (sensor_id, metric_name, seconds), window in self.windows.items():
+            self.sensor_windows.setdefault(sensor_id, []).append((metric_name, window))
+
+        self.vectorized = np is not None and len(self.keys) >= ALERT_VECTOR_MIN_PAIRS
+        table = (sensor, metric, low, sign, inclusive, threshold, clear, count, counters, active)
+        if self.vectorized:
+            table = tuple(np.array(column, dtype=dtype) for column, dtype in zip(table, (
+                np.intp, np.intp, np.intp, np.float64, bool, np.float64, np.float64, np.int64, np.int64, bool)))
+        (self.sensor, self.metric, self.low, self.sign, self.inclusive, self.threshold, self.clear, self.count,
+         self.counters, self.active) = table
+        # The scalar path unpacks one tuple per pair instead of indexing eight columns
+        self.checks = None if self.vectorized else list(zip(metric, low, sign, inclusive, threshold, clear, count,
+                                                            self.pair_windows))
+        self.windowed = [(pair, *window) for pair, window in enumerate(self.pair_windows) if window is not None]
+
+        # Swap in whole per-sensor dicts so concurrent readers never see one change size
+        for row, sensor_id in enumerate(self.sensor_ids):
+            self.states[sensor_id] = {self.keys[pair][1]: bool(self.active[pair])
+                                      for pair in range(self.starts[row], self.starts[row + 1])}
+
+    def add(self, reading):
+        """Feed a frame to the sensor's sliding windows (a reading sink)"""
+        windows = self.sensor_windows.get(reading.sensor_id)
+        if windows:
+            with self._lock:
+                for metric, window in windows:
+                    window.add(reading.timestamp, getattr(reading, metric))
+
+    def evaluate(self, batch, value_mode='last'):
+        """Update every pair of the (definition, Aggregate) batch; return (sensor ID, rule name, message) per transition"""
+        with self._lock:
+            # Per sensor: the readings checked by high (>, >=) and low (<, <=) rules, one value per metric
+            samples = {}
+            for definition, aggregate in batch:
+                if aggregate.sensor_id in self.rows:
+                    samples[aggregate.sensor_id] = (definition, select_alert_values(aggregate, value_mode))
+                    for metric, window in self.sensor_windows.get(aggregate.sensor_id, ()):
+                        window.expire(aggregate.end)
+            if not samples:
+                return []
+            changed = self._evaluate_vector(samples) if self.vectorized else self._evaluate_scalar(samples)
+
+            transitions = []
+            for pair in sorted(changed):
+                sensor_id, name = self.keys[pair]
+                rule = self.rules[pair]
+                definition, readings = samples[sensor_id]
+                reading = readings[self.low[pair]]
+                active = bool(self.active[pair])
+                self.states[sensor_id][name] = active
+                fields = {metric: getattr(reading, metric) for metric in ALERT_METRICS}
+                window = self.pair_windows[pair]
+                value = window[0].statistic(window[1]) if window else fields[rule.metric]
+                message = (rule.message if active else rule.clear_message).format(
+                    name=name, location=definition['location'], sensor=sensor_id, metric=rule.metric,
+                    value=value, threshold=rule.threshold, **fields)
+                transitions.append((sensor_id, name, message))
+            return transitions
+
+    def _evaluate_scalar(self, samples):
+        changed = []
+        counters, active = self.counters, self.active
+        checks = self.checks
+        for sensor_id, (definition, readings) in samples.items():
+            values = [[getattr(reading, metric) for metric in ALERT_METRICS] for reading in readings]
+            row = self.rows[sensor_id]
+            for pair in range(self.starts[row], self.starts[row + 1]):
+                metric, low, sign, inclusive, threshold, clear, count, window = checks[pair]
+                value = window[0].statistic(window[1]) if window else values[low][metric]
+                past = sign * (value - threshold)
+                past_clear = sign * (value - clear)
+                if inclusive:
+                    triggered, cleared = past >= 0, not past_clear >= 0
+                else:
+                    triggered, cleared = past > 0, not past_clear > 0
+                counters[pair] = counters[pair] + 1 if triggered else 0
+                if active[pair]:
+                    if cleared:
+                        active[pair] = False
+                        changed.append(pair)
+                elif triggered and counters[pair] >= count:
+                    active[pair] = True
+                    changed.append(pair)
+        return changed
+
+    def _evaluate_vector(self, samples):
+        values = np.full((len(self.sensor_ids), 2, len(ALERT_METRICS)), np.nan)
+        reported = np.zeros(len(self.sensor_ids), dtype=bool)
+        for sensor_id, (definition, readings) in samples.items():
+            row = self.rows[sensor_id]
+            reported[row] = True
+            values[row] = [[getattr(reading, metric) for metric in ALERT_METRICS] for reading in readings]
+
+        mask = reported[self.sensor]
+        value = values[self.sensor, self.low, self.metric]
+        for pair, window, statistic in self.windowed:
+            value[pair] = window.statistic(statistic)
+        past = self.sign * (value - self.threshold)
+        past_clear = self.sign * (value - self.clear)
+        triggered = np.where(self.inclusive, past >= 0, past > 0) & mask
+        cleared = ~np.where(self.inclusive, past_clear >= 0, past_clear > 0) & mask
+
+        self.counters = np.where(triggered, self.counters + 1, np.where(mask, 0, self.counters))
+        flipped = (triggered & (self.counters >= self.count) & ~self.active) | (cleared & self.active)
+        self.active ^= flipped
+        return np.flatnonzero(flipped).tolist()
+
+
+def check_alerts(settings, batch):
+    """Evaluate the alert rules for a batch of (definition, Aggregate) pairs and queue Slack messages for changes"""
+    if alert_engine is None:
+        return
+    for sensor_id, name, message in alert_engine.evaluate(batch, settings['ALERT_VALUE_MODE']):
+        queue_slack_alert(message, key=(sensor_id, name))
+
+
+def process_reading(settings, definition, aggregate):
+    """Run logging and uploads for one sensor's reporting interval"""
+    sensor_id = aggregate.sensor_id
+    last = aggregate.last
+
+    logger.info(f"Read values [{sensor_id}] - Temp: {last.temperature_f:.1f}°F ({last.temperature_c:.1f}°C), Humidity: {last.humidity:.1f}%, CO2: {last.co2}ppm "
+                f"({aggregate.count} samples, mean CO2 {aggregate.mean.co2:.0f}ppm)")
+
+    # Log the last sample in the original format, followed by the interval aggregates
+    if settings['SENSOR_LOG_FORMAT'] in ('text', 'both'):
+        write_text_log(definition, aggregate)
+
+    # Send the configured interval statistic to Adafruit IO
+    queue_upload(settings, definition, getattr(aggregate, settings['REPORT_STATISTIC']))
+
+
+def write_text_log(definition, aggregate):
+    """Append one interval to the human-readable sensor log"""
+    sensor_id = aggregate.sensor_id
+    location = definition['location']
+    last = aggregate.last
+    timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last.timestamp))
+    sensor_log.write(f"{timestamp} - {location} - Temperature: {last.temperature_f}°F, Humidity: {last.humidity}%, CO2: {last.co2}ppm - Sensor: {sensor_id}"
+                     f" - Samples: {aggregate.count}"
+                     f", Temperature min/mean/max: {aggregate.min.temperature_f:.2f}/{aggregate.mean.temperature_f:.2f}/{aggregate.max.temperature_f:.2f}°F"
+                     f", Humidity min/mean/max: {aggregate.min.humidity:.2f}/{aggregate.mean.humidity:.2f}/{aggregate.max.humidity:.2f}%"
+                     f", CO2 min/mean/max: {aggregate.min.co2:.0f}/{aggregate.mean.co2:.1f}/{aggregate.max.co2:.0f}ppm\n")
+
+
+def apply_settings(previous, settings, engine, scheduler):
+    """Bring the running monitor in line with changed settings, rebuilding only what they affect"""
+    global adafruit_io_client
+    # Locations, feed names and alert rules live outside [General]; refresh them on every new snapshot
+    needs_restart = engine.update_definitions(read_sensor_definitions(CONF_FILE, settings))
+    if alert_engine is not None:
+        alert_engine.compile(read_alert_rules(CONF_FILE, settings), alert_engine.sensor_ids)
+    if needs_restart:
+        logger.warning(f"Sensor changes for {', '.join(sorted(needs_restart))} take effect after a restart")
+
+    changed = {key for key in settings if settings[key] != previous.get(key)}
+    if not changed:
+        return
+    logger.info(f"Applying changed settings: {', '.join(sorted(changed))}")
+
+    if changed & {'ADAFRUIT_IO_USERNAME', 'ADAFRUIT_IO_KEY'}:
+        adafruit_io_client = Client(settings['ADAFRUIT_IO_USERNAME'], settings['ADAFRUIT_IO_KEY'])
+    if changed & {'SLACK_API_TOKEN', 'SLACK_CHANNEL'}:
+        configure_slack(settings)
+    if changed & {'LOG_DURABILITY', 'LOG_FLUSH_SECONDS'}:
+        configure_log_writers(settings)
+    if changed & {'LOG_LEVEL', 'LOG_DEBUG_PER_MINUTE'}:
+        configure_logging(settings)
+    if alert_dispatcher is not None:
+        alert_dispatcher.max_size = settings['ALERT_QUEUE_SIZE']
+        alert_dispatcher.overflow = settings['ALERT_QUEUE_OVERFLOW']
+    if upload_queue is not None:
+        upload_queue.max_entries = settings['UPLOAD_QUEUE_MAX_ENTRIES']
+    if upload_flusher is not None:
+        upload_flusher.settings = settings
+    stream_broadcaster.max_clients = settings['STREAM_MAX_CLIENTS']
+    if 'MINUTES_BETWEEN_READS' in changed:
+        scheduler.reschedule(settings['MINUTES_BETWEEN_READS'] * 60)
+    if changed & set(RESTART_SETTINGS):
+        logger.warning(f"{', '.join(sorted(changed & set(RESTART_SETTINGS)))} take effect after a restart")
+
+
+def run_monitoring():
+    """Main monitoring function"""
+    global adafruit_io_client, alert_dispatcher, alert_engine, upload_queue, upload_flusher, retry_scheduler, settings_watcher, history_db
+
+    # Read settings
+    try:
+        settings = settings_cache.get()
+        definitions = read_sensor_definitions(CONF_FILE, settings)
+        rules = read_alert_rules(CONF_FILE, settings)
+
+        # Initialize Adafruit IO client
+        adafruit_io_client = Client(settings['ADAFRUIT_IO_USERNAME'],
+                                  settings['ADAFRUIT_IO_KEY'])
+        group_name = settings['ADAFRUIT_IO_GROUP_NAME']  # e.g., 'castle-sensors'
+        logger.info(f"Adafruit IO client initialized successfully for group {group_name}")
+    except Exception as e:
+        log_error(f"Failed to initialize settings or Adafruit IO client: {e}")
+        sys.exit(1)
+
+    configure_log_writers(settings)
+    configure_logging(settings)
+
+    # Initialize every SCD4x sensor and one polling worker per I2C bus
+    devices = open_sensors(definitions)
+    if not devices:
+        log_error("Failed to initialize sensor: no SCD4X sensors available")
+        sys.exit(1)
+    # Alert rules are checked for all sensors at once after every interval
+    alert_engine = AlertRuleEngine(rules, [definition['id'] for definition in definitions])
+    logger.info(f"{len(rules)} alert rule(s) compiled into {len(alert_engine.keys)} sensor checks"
+                f"{' (vectorized)' if alert_engine.vectorized else ''}")
+
+    # Every frame goes to the enabled history stores and the alert rules' sliding windows
+    history_store = None
+    history_db = None
+    sinks = []
+    history_archive = None
+    if settings['SENSOR_LOG_FORMAT'] in ('binary', 'both'):
+        history_store = BinaryHistoryStore()
+        history_archive = CompressedHistoryArchive(os.path.join(HISTORY_DIR, HISTORY_ARCHIVE_FILE))
+        sinks.append(history_store.append)
+    if settings['HISTORY_DB_FILE']:
+        history_db = HistoryDatabase(settings['HISTORY_DB_FILE'])
+        sinks.append(history_db.add)
+
+    sinks.append(alert_engine.add)
+    sinks.append(publish_latest)
+
+    def record_reading(reading):
+        for sink in sinks:
+            sink(reading)
+
+    engine = AcquisitionEngine(devices, on_reading=record_reading)
+    engine.start()
+    logger.info(f"{len(devices)} sensor(s) running on {len(engine.workers)} I2C bus(es)")
+    time.sleep(2)  # Give sensors time to start up
+
+    # Network retries run on timers so no thread ever sleeps on a failed request
+    retry_scheduler = RetryScheduler()
+    retry_scheduler.start()
+
+    # Deliver Slack alerts off the monitoring thread over one kept-alive connection
+    configure_slack(settings)
+    alert_dispatcher = AlertDispatcher(retry_scheduler, max_size=settings['ALERT_QUEUE_SIZE'],
+                                       overflow=settings['ALERT_QUEUE_OVERFLOW'])
+    alert_dispatcher.start()
+
+    # Readings go to the on-disk queue first; the flusher uploads them when the network allows
+    upload_queue = UploadQueue(max_entries=settings['UPLOAD_QUEUE_MAX_ENTRIES'])
+    upload_flusher = UploadFlusher(upload_queue, settings, retry_scheduler)
+    upload_flusher.start()
+
+    scheduler = DeadlineScheduler(settings['MINUTES_BETWEEN_READS'] * 60, shutdown_event)
+    Thread(target=lambda: shutdown_event.wait() or scheduler.interrupt(), name='scheduler-shutdown', daemon=True).start()
+
+    # Settings edits (from the web UI or by hand) are applied live
+    settings_watcher = SettingsWatcher(settings_cache, settings,
+                                       lambda previous, current: apply_settings(previous, current, engine, scheduler))
+    settings_watcher.start()
+
+    try:
+        while scheduler.wait():
+            settings = settings_watcher.current
+            try:
+                # Close the interval for every sensor; a sensor without any frame
+                # yet (e.g. right after start-up) gets one measurement period to catch up
+                pending = engine.sensor_ids
+                retry_until = time.monotonic() + SCD4X_MEASUREMENT_PERIOD + 1
+                while pending:
+                    batch = engine.collect(pending)
+                    for definition, aggregate in batch:
+                        pending.discard(definition['id'])
+                        process_reading(settings, definition, aggregate)
+                    check_alerts(settings, batch)
+                    if not pending or time.monotonic() >= retry_until or shutdown_event.wait(1):
+                        break
+                if pending:
+                    logger.warning(f"No reading this interval from: {', '.join(sorted(pending))}")
+                publish_latest()  # Alert states may have changed
+                if history_store is not None:
+                    history_store.flush()
+                    history_store.compact(history_archive)
+                if history_db is not None:
+                    history_db.commit()
+                    history_db.prune(settings['HISTORY_RAW_RETENTION_DAYS'], settings['HISTORY_MINUTE_RETENTION_DAYS'])
+                logger.debug(f"I2C transactions per reading: {engine.transactions_per_reading():.1f}")
+                logger.debug(f"Alert queue: {alert_dispatcher.stats()}")
+                logger.debug(f"Adafruit IO rate budget: {upload_flusher.limiter.stats()}")
+            except Exception as e:
+                log_error(f"Error in monitoring loop: {e}")
+    finally:
+        settings_watcher.stop()
+        settings_watcher = None
+        engine.stop()
+        if history_store is not None:
+            history_store.close()
+            history_archive.close()
+        if history_db is not None:
+            database, history_db = history_db, None
+            database.close()
+        # Drain pending alerts before the process exits
+        alert_dispatcher.close()
+        alert_dispatcher = None
+        alert_engine = None
+        # Anything not uploaded yet stays queued on disk for the next start
+        upload_flusher.stop()
+        upload_queue.close()
+        upload_flusher = upload_queue = None
+        retry_scheduler.stop()
+        retry_scheduler = None
+
+
+def serve_app(port, settings):
+    """Serve the web UI until shutdown_event is set (the development server runs until the process exits)"""
+    if settings['WEB_SERVER'] == 'waitress':
+        if waitress is not None:
+            channels = {}
+            server = waitress.create_server(app, map=channels, host='0.0.0.0', port=port, ident='SingleSCD40',
+                                            threads=settings['WEB_THREADS'],
+                                            connection_limit=settings['WEB_CONNECTION_LIMIT'],
+                                            channel_timeout=settings['WEB_CHANNEL_TIMEOUT'])
+
+            def close_on_shutdown():
+                shutdown_event.wait()
+                stream_broadcaster.close()  # Ends open event streams instead of waiting for their heartbeat
+                # Let in-flight requests finish, then close every connection so run() returns
+                server.task_dispatcher.shutdown()
+                waitress.wasyncore.close_all(channels)
+
+            Thread(target=close_on_shutdown, name='web-shutdown', daemon=True).start()
+            logger.info(f"Serving on port {port} with {settings['WEB_THREADS']} worker threads")
+            server.run()
+            return
+        logger.warning("waitress is not installed (pip install waitress), falling back to the development server")
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
+
+
+def signal_handler(signum, frame):
+    """Handle shutdown signals"""
+    logger.info("Shutdown signal received. Cleaning up...")
+    shutdown_event.set()
+
+
+if __name__ == '__main__':
+    # Handle shutdown signals
+    signal.signal(signal.SIGTERM, signal_handler)
+    signal.signal(signal.SIGINT, signal_handler)
+
+    # Commit buffered log lines in the background; closes the logs on shutdown
+    log_flush_thread = Thread(target=flush_log_writers, name='log-flusher')
+    log_flush_thread.start()
+
+    try:
+        # Start the monitoring thread
+        monitoring_thread = Thread(target=run_monitoring)
+        monitoring_thread.start()
+
+        # Find an available port and start the web UI
+        try:
+            web_settings = settings_cache.get()
+        except ValueError:
+            web_settings = {key: default for key, (default, choices) in OPTIONAL_SETTINGS.items()}
+        stream_broadcaster.max_clients = web_settings['STREAM_MAX_CLIENTS']
         port = find_available_port(5000)
         logger.info(f"Starting Flask app on port {port}...")
-        app.run(host='0.0.0.0', port=port, debug=False)
+        serve_app(port, web_settings)
     except Exception as e:
         log_error(f"Error starting server: {e}")
     finally:
         shutdown_event.set()
         monitoring_thread.join()
+        log_flush_thread.join()
         logger.info("Application has been shut down gracefully.")
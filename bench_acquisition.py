@@ -0,0 +1,68 @@
+# Benchmark how the acquisition cycle time grows with the number of sensors
+import argparse
+import time
+
+from SingleSCD40 import AcquisitionEngine
+
+
+class FakeSCD4X:
+    """Stand-in SCD4x that spends a fixed time on every I2C transaction"""
+
+    def __init__(self, transaction_time):
+        self.transaction_time = transaction_time
+        self.transactions = 0
+        self.frames = 0
+
+    def read_frame(self):
+        # data ready poll and read_measurement: a write and a read each
+        for _ in range(4):
+            time.sleep(self.transaction_time)
+        self.transactions += 4
+        self.frames += 1
+        return 600, 21.5, 40.0
+
+
+def make_devices(sensor_count, bus_count, transaction_time):
+    devices = []
+    for index in range(sensor_count):
+        bus = index % bus_count
+        definition = {
+            'id': f"s{index}",
+            'location': f"Room {index}",
+            'bus': f"bus{bus}",
+            'mux_address': 0x70,
+            'mux_channel': index // bus_count % 8,
+        }
+        devices.append((definition, FakeSCD4X(transaction_time)))
+    return devices
+
+
+def time_cycles(engine, cycles):
+    """Let every bus worker complete its sweeps and return the slowest bus's sweep time"""
+    engine.start()
+    while min(worker.sweeps for worker in engine.workers.values()) < cycles:
+        time.sleep(0.01)
+    engine.stop()
+    return max(worker.sweep_seconds for worker in engine.workers.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Acquisition cycle time vs. sensor count")
+    parser.add_argument('--transaction-ms', type=float, default=2.0, help="simulated I2C transaction time")
+    parser.add_argument('--cycles', type=int, default=5)
+    args = parser.parse_args()
+
+    transaction_time = args.transaction_ms / 1000
+    print(f"{'sensors':>8} {'buses':>6} {'cycle ms':>10} {'ms/sensor':>10}")
+    for bus_count in (1, 2, 4):
+        for sensor_count in (1, 4, 8, 16, 32, 64):
+            if sensor_count < bus_count:
+                continue
+            devices = make_devices(sensor_count, bus_count, transaction_time)
+            engine = AcquisitionEngine(devices, poll_interval=0, measurement_period=0)
+            cycle = time_cycles(engine, args.cycles)
+            print(f"{sensor_count:>8} {bus_count:>6} {cycle * 1000:>10.1f} {cycle * 1000 / sensor_count:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
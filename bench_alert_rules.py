@@ -0,0 +1,96 @@
+# Alert evaluation cost per interval: per-rule dict lookups vs. the compiled table, scalar and vectorized
+import argparse
+import random
+import time
+
+import SingleSCD40
+from SingleSCD40 import AlertRule, AlertRuleEngine, Aggregate, Reading, ALERT_METRICS, np
+
+
+def make_rules(count):
+    """count rules spread over every metric and comparator"""
+    rules = []
+    for index in range(count):
+        metric = ALERT_METRICS[index % len(ALERT_METRICS)]
+        comparator = ('>=', '<=', '>', '<')[index // len(ALERT_METRICS) % 4]
+        centre = {'temperature_f': 72.0, 'temperature_c': 22.0, 'humidity': 45.0, 'co2': 800.0}[metric]
+        threshold = centre * random.uniform(0.9, 1.1)
+        rules.append(AlertRule(f"rule{index}", metric, comparator, threshold, 3, centre * 0.01,
+                               "{name} at {location} ({sensor}): {value:.1f}", "{name} cleared: {value:.1f}", None))
+    return rules
+
+
+def make_batch(sensor_ids):
+    """One interval of aggregates hovering around the rule thresholds"""
+    batch = []
+    for sensor_id in sensor_ids:
+        reading = Reading(sensor_id, time.time(), random.gauss(22, 0.3), random.gauss(45, 0.5), random.gauss(800, 8))
+        batch.append(({'id': sensor_id, 'location': sensor_id},
+                      Aggregate(sensor_id, 0, 0, 60, reading, reading, reading, reading)))
+    return batch
+
+
+def evaluate_dicts(rules, states, counters, batch):
+    """The previous approach: one block per rule, each looking up its state, counter and threshold by name"""
+    transitions = 0
+    for definition, aggregate in batch:
+        reading = aggregate.last
+        sensor_states, sensor_counters = states[aggregate.sensor_id], counters[aggregate.sensor_id]
+        for rule in rules:
+            value = getattr(reading, rule.metric)
+            if (value >= rule.threshold if rule.comparator == '>=' else value > rule.threshold if rule.comparator == '>'
+                    else value <= rule.threshold if rule.comparator == '<=' else value < rule.threshold):
+                sensor_counters[rule.name] += 1
+                if sensor_counters[rule.name] >= rule.count and not sensor_states[rule.name]:
+                    rule.message.format(name=rule.name, location=definition['location'],
+                                        sensor=aggregate.sensor_id, value=value)
+                    sensor_states[rule.name] = True
+                    transitions += 1
+            else:
+                sensor_counters[rule.name] = 0
+                if sensor_states[rule.name]:
+                    rule.clear_message.format(name=rule.name, value=value)
+                    sensor_states[rule.name] = False
+                    transitions += 1
+    return transitions
+
+
+def timed(label, evaluate, batches, pairs):
+    start = time.perf_counter()
+    transitions = sum(evaluate(batch) for batch in batches)
+    elapsed = (time.perf_counter() - start) / len(batches)
+    print(f"{label:<22} {elapsed * 1000:8.2f} ms per interval  {elapsed / pairs * 1e9:7.0f} ns per pair  "
+          f"{transitions / len(batches):6.1f} transitions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alert rule evaluation per interval")
+    parser.add_argument('--rules', type=int, default=10000)
+    parser.add_argument('--sensors', type=int, default=1)
+    parser.add_argument('--intervals', type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(1)
+    rules = make_rules(args.rules)
+    sensor_ids = [f"sensor{index}" for index in range(args.sensors)]
+    batches = [make_batch(sensor_ids) for _ in range(args.intervals)]
+    pairs = args.rules * args.sensors
+    print(f"{args.rules} rules x {args.sensors} sensor(s) = {pairs} pairs, {args.intervals} intervals")
+
+    states = {sensor_id: {rule.name: False for rule in rules} for sensor_id in sensor_ids}
+    counters = {sensor_id: {rule.name: 0 for rule in rules} for sensor_id in sensor_ids}
+    timed('per-rule dict lookups', lambda batch: evaluate_dicts(rules, states, counters, batch), batches, pairs)
+
+    for label, min_pairs in (('compiled, scalar', pairs + 1), ('compiled, vectorized', 0)):
+        if min_pairs == 0 and np is None:
+            print(f"{label:<22} skipped: NumPy is not installed")
+            continue
+        SingleSCD40.ALERT_VECTOR_MIN_PAIRS = min_pairs
+        start = time.perf_counter()
+        engine = AlertRuleEngine(rules, sensor_ids, states={})
+        print(f"{label:<22} compiled in {(time.perf_counter() - start) * 1000:.1f} ms")
+        timed(label, lambda batch: len(engine.evaluate(batch)), batches, pairs)
+
+
+if __name__ == '__main__':
+    main()
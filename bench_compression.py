@@ -0,0 +1,92 @@
+# Compressed history archive: encode/decode throughput, bytes per reading and block skipping on SCD40-like traces
+import argparse
+import math
+import os
+import random
+import struct
+import tempfile
+import time
+
+from SingleSCD40 import CompressedHistoryArchive, encode_block, HISTORY_RECORD, GORILLA_BLOCK_RECORDS
+
+
+def scd40_trace(count, seed=0):
+    """Readings quantised the way the SCD4x reports them: 16-bit temperature/RH ticks, integer ppm CO2,
+    a diurnal cycle, occupancy CO2 bumps and a few milliseconds of read jitter every 5 s"""
+    rng = random.Random(seed)
+    start = time.time() - count * 5
+    rows = []
+    co2 = 550.0
+    for i in range(count):
+        hour = (i * 5 / 3600) % 24
+        occupied = 8 <= hour < 22
+        temperature = 21 + 1.5 * math.sin((hour - 9) / 24 * 2 * math.pi) + rng.gauss(0, 0.03)
+        humidity = 45 - 5 * math.sin((hour - 9) / 24 * 2 * math.pi) + rng.gauss(0, 0.1)
+        # Drifts toward an occupied/unoccupied level, with an occasional crowded-room spike
+        target = (1900 if hour % 6 < 0.25 else 1000) if occupied else 480
+        co2 = max(co2 + (target - co2) * 0.004 + rng.gauss(0, 3), 400)
+        t_ticks = round((temperature + 45) * 65535 / 175)
+        rh_ticks = round(humidity * 65535 / 100)
+        rows.append((start + i * 5 + rng.gauss(0, 0.004), -45 + 175 * t_ticks / 65535,
+                     100 * rh_ticks / 65535, float(round(co2))))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gorilla-compressed history archive")
+    parser.add_argument('--readings', type=int, default=200000)
+    args = parser.parse_args()
+    rows = scd40_trace(args.readings)
+    blocks = [rows[i:i + GORILLA_BLOCK_RECORDS] for i in range(0, len(rows), GORILLA_BLOCK_RECORDS)]
+
+    start = time.perf_counter()
+    encoded = [encode_block('main', block) for block in blocks]
+    encode_time = time.perf_counter() - start
+    compressed = sum(len(data) for data in encoded)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        text_size = 0
+        for timestamp, temperature_c, humidity, co2 in rows:
+            text_size += len(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))} - Living Room - "
+                             f"Temperature: {temperature_c * 9 / 5 + 32}°F, Humidity: {humidity}%, CO2: {co2}ppm\n".encode())
+
+        archive = CompressedHistoryArchive(os.path.join(tmp, 'archive.scdg'))
+        archive.append('main', rows)
+        archive.flush()
+
+        start = time.perf_counter()
+        decoded = sum(1 for _ in archive.scan())
+        decode_time = time.perf_counter() - start
+
+        # Decoding only what a query needs: one column, or blocks with CO2 above a threshold
+        start = time.perf_counter()
+        for block in archive.blocks:
+            archive._decode(block, ('co2',))
+        column_time = time.perf_counter() - start
+        start = time.perf_counter()
+        excursions = sum(1 for _ in archive.select('co2', low=1500))
+        select_time = time.perf_counter() - start
+        touched = sum(1 for block in archive.blocks if block.may_contain('co2', low=1500))
+        archive.close()
+
+        # Round trip is exact at the binary store's float32 precision
+        original = [struct.unpack('<dIfff', HISTORY_RECORD.pack(r[0], 0, *r[1:])) for r in rows[:GORILLA_BLOCK_RECORDS]]
+        archive = CompressedHistoryArchive(os.path.join(tmp, 'archive.scdg'))
+        first = list(archive.scan(end=rows[GORILLA_BLOCK_RECORDS][0]))
+        archive.close()
+        exact = all(abs(a.timestamp - b[0]) < 0.0005 and (a.temperature_c, a.humidity, a.co2) == b[2:]
+                    for a, b in zip(first, original))
+
+    print(f"text log:    {text_size / len(rows):6.1f} bytes/reading")
+    print(f"binary:      {HISTORY_RECORD.size:6.1f} bytes/reading")
+    print(f"compressed:  {compressed / len(rows):6.1f} bytes/reading "
+          f"({text_size / compressed:.1f}x vs text, {HISTORY_RECORD.size * len(rows) / compressed:.1f}x vs binary)")
+    print(f"encode:      {len(rows) / encode_time:>10,.0f} readings/s")
+    print(f"decode all:  {decoded / decode_time:>10,.0f} readings/s")
+    print(f"decode co2:  {len(rows) / column_time:>10,.0f} readings/s")
+    print(f"co2 >= 1500: {excursions} readings from {touched}/{len(archive.blocks)} blocks in {select_time * 1000:.1f} ms")
+    print(f"round trip:  {'exact' if exact else 'MISMATCH'}")
+
+
+if __name__ == '__main__':
+    main()
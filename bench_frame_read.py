@@ -0,0 +1,78 @@
+# Count I2C transactions per reading: Adafruit property reads vs. one frame read
+import argparse
+import struct
+import time
+
+from SingleSCD40 import FrameSCD4X, SCD4X_CRC8_TABLE
+
+
+def _word(value):
+    data = struct.pack('>H', value)
+    return data + bytes([SCD4X_CRC8_TABLE[SCD4X_CRC8_TABLE[0xFF ^ data[0]] ^ data[1]]])
+
+
+class FakeSCD4xBus:
+    """Minimal busio.I2C stand-in that answers like an SCD4x in periodic mode"""
+
+    def __init__(self):
+        self.transactions = 0
+        self.ready = False
+        self.command = None
+
+    def try_lock(self):
+        return True
+
+    def unlock(self):
+        pass
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        self.transactions += 1
+        data = bytes(buffer[start:end])
+        self.command = struct.unpack('>H', data)[0] if len(data) >= 2 else None
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        self.transactions += 1
+        if self.command == 0xE4B8:  # get_data_ready_status
+            reply = _word(0x8006 if self.ready else 0x8000)
+        elif self.command == 0xEC05:  # read_measurement
+            reply = _word(612) + _word(0x6667) + _word(0x5EB8)
+            self.ready = False
+        else:
+            reply = bytes(end - start if end else len(buffer))
+        end = len(buffer) if end is None else end
+        buffer[start:end] = reply[:end - start].ljust(end - start, b'\0')
+
+
+def property_read(sensor):
+    if sensor.data_ready:
+        return sensor.CO2, sensor.temperature, sensor.relative_humidity
+
+
+def frame_read(sensor):
+    return sensor.read_frame()
+
+
+def measure(reader, readings):
+    bus = FakeSCD4xBus()
+    sensor = FrameSCD4X(bus)
+    bus.transactions = 0
+    start = time.perf_counter()
+    for _ in range(readings):
+        bus.ready = True
+        reader(sensor)
+    elapsed = time.perf_counter() - start
+    return bus.transactions / readings, elapsed / readings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="I2C transactions per SCD4x reading")
+    parser.add_argument('--readings', type=int, default=200)
+    args = parser.parse_args()
+
+    for name, reader in (('properties', property_read), ('read_frame', frame_read)):
+        transactions, seconds = measure(reader, args.readings)
+        print(f"{name:>12}: {transactions:.1f} I2C transactions/reading, {seconds * 1000:.2f} ms/reading")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# /api/history latency over long ranges: query, LTTB downsampling and JSON vs binary encoding
+import argparse
+import math
+import os
+import random
+import tempfile
+import time
+
+import SingleSCD40
+from SingleSCD40 import HistoryDatabase, app, lttb, np
+
+DAY = 86400
+
+
+def build_history(path, days, period):
+    """A history database with `days` of readings every `period` seconds ending now"""
+    database = HistoryDatabase(path)
+    rng = random.Random(0)
+    end = time.time()
+    timestamp = end - days * DAY
+    batch = []
+    while timestamp < end:
+        hour = (timestamp / 3600) % 24
+        co2 = 600 + 400 * max(0.0, math.sin((hour - 8) / 14 * math.pi)) + rng.gauss(0, 20)
+        batch.append(('main', timestamp, 21 + math.sin(hour / 24 * 2 * math.pi), 45 + rng.gauss(0, 1), co2))
+        if len(batch) == 50000:
+            database.add_many(batch)
+            batch = []
+        timestamp += period
+    database.add_many(batch)
+    return database, end
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/api/history latency")
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--period', type=float, default=60, help="seconds between stored readings")
+    parser.add_argument('--points', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    SingleSCD40.logger.setLevel('WARNING')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        SingleSCD40.history_db, end = build_history(os.path.join(tmp, 'history.db'), args.days, args.period)
+        print(f"built {args.days} days of history in {time.perf_counter() - start:.1f} s")
+
+        if np is not None:
+            x = np.arange(100000, dtype=np.float64)
+            y = np.sin(x / 500) + np.random.default_rng(0).normal(0, 0.1, x.size)
+            start = time.perf_counter()
+            lttb(x, y, args.points)
+            print(f"lttb 100000 -> {args.points}: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        client = app.test_client()
+        for days in (1, 30, 365, args.days):
+            for output in ('json', 'binary'):
+                url = f"/api/history?metric=co2&from={end - days * DAY}&to={end}&points={args.points}&format={output}"
+                latencies = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    latencies.append(time.perf_counter() - started)
+                    assert response.status_code == 200, response.data
+                latencies.sort()
+                print(f"{days:>4} days {output:<6} {len(response.data):>7} bytes  "
+                      f"p50 {latencies[len(latencies) // 2] * 1000:6.1f} ms  p99 {latencies[-1] * 1000:6.1f} ms")
+        SingleSCD40.history_db.close()
+
+
+if __name__ == '__main__':
+    main()
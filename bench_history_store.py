@@ -0,0 +1,78 @@
+# Text sensor log vs. binary history store: write cost, file size and full-history scan time
+import argparse
+import os
+import re
+import tempfile
+import time
+
+import SingleSCD40
+from SingleSCD40 import BinaryHistoryStore, Reading
+
+LINE_PATTERN = re.compile(r"^(\S+ \S+) - (.*?) - Temperature: ([\d.]+)°F, Humidity: ([\d.]+)%, CO2: ([\d.]+)ppm")
+
+
+def make_readings(count, sensors):
+    start = time.time() - count * 5
+    return [Reading(f"s{i % sensors}", start + i * 5, 21.0 + (i % 100) / 50, 40.0 + (i % 30) / 10, 600 + i % 400)
+            for i in range(count)]
+
+
+def write_text(path, readings):
+    for reading in readings:
+        # Same open/append/close per line as the original monitoring loop
+        with open(path, 'a') as file:
+            timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(reading.timestamp))
+            file.write(f"{timestamp} - Room {reading.sensor_id} - Temperature: {reading.temperature_f}°F, "
+                       f"Humidity: {reading.humidity}%, CO2: {reading.co2}ppm\n")
+
+
+def scan_text(path):
+    total = 0.0
+    with open(path) as file:
+        for line in file:
+            match = LINE_PATTERN.match(line)
+            if match:
+                total += float(match.group(5))
+    return total
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text log vs. binary history store")
+    parser.add_argument('--readings', type=int, default=200000)
+    parser.add_argument('--sensors', type=int, default=4)
+    args = parser.parse_args()
+    readings = make_readings(args.readings, args.sensors)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        text_path = os.path.join(tmp, 'sensor_readings.log')
+        text_write, _ = timed(write_text, text_path, readings)
+        text_scan, _ = timed(scan_text, text_path)
+        print(f"text:   write {text_write / args.readings * 1e6:6.1f} us/reading, "
+              f"{os.path.getsize(text_path) / args.readings:6.1f} bytes/reading, full scan {text_scan:.2f} s")
+
+        store_dir = os.path.join(tmp, 'history')
+        store = BinaryHistoryStore(store_dir)
+        binary_write, _ = timed(lambda: [store.append(reading) for reading in readings])
+        store.flush()
+        binary_scan, _ = timed(lambda: sum(reading.co2 for reading in store.scan()))
+        print(f"binary: write {binary_write / args.readings * 1e6:6.1f} us/reading, "
+              f"{directory_size(store_dir) / args.readings:6.1f} bytes/reading, full scan {binary_scan:.2f} s")
+
+        if SingleSCD40.np is not None:
+            numpy_scan, _ = timed(lambda: sum(float(array['co2'].sum()) for array in store.arrays()))
+            print(f"numpy:  full scan over zero-copy segment views {numpy_scan * 1000:.1f} ms")
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# Legacy sensor log importer: parse throughput and end-to-end import into the history database
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import SingleSCD40
+from SingleSCD40 import HistoryDatabase, import_sensor_log, import_sensor_logs, iter_log_chunks, parse_log_chunk
+
+
+def write_log(path, lines, start):
+    with open(path, 'w') as file:
+        for i in range(lines):
+            timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start + i * 5))
+            file.write(f"{timestamp} - Living Room - Temperature: {70 + (i % 100) / 10}°F, "
+                       f"Humidity: {40 + (i % 30) / 10}%, CO2: {600 + i % 400}ppm\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensor log importer throughput")
+    parser.add_argument('--lines', type=int, default=1000000)
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=None, help="parser processes (default: CPU count)")
+    args = parser.parse_args()
+    SingleSCD40.logger.setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f"sensor_readings_{n}.log") for n in range(args.files)]
+        for n, path in enumerate(paths):
+            write_log(path, args.lines // args.files, time.time() - (n + 1) * 86400 * 365)
+        size = sum(os.path.getsize(path) for path in paths)
+
+        # The two halves of an import: parsing (done by the workers) and writing (one connection)
+        start = time.perf_counter()
+        chunks = [(end, parse_log_chunk(data)) for end, data in iter_log_chunks(paths[0])]
+        parsed = sum(len(rows) for _, (rows, _) in chunks)
+        elapsed = time.perf_counter() - start
+        print(f"parse only:        {parsed / elapsed:>10,.0f} lines/s ({os.path.getsize(paths[0]) / elapsed / 1e6:.0f} MB/s)")
+
+        history = HistoryDatabase(os.path.join(tmp, 'write-only.db'))
+        start = time.perf_counter()
+        for end, (rows, partials) in chunks:
+            history.import_chunk(paths[0], end, rows, partials)
+        elapsed = time.perf_counter() - start
+        history.close()
+        print(f"write only:        {parsed / elapsed:>10,.0f} lines/s")
+        del chunks
+
+        db_path = os.path.join(tmp, 'history.db')
+        start = time.perf_counter()
+        imported = import_sensor_log(paths[0], db_path)
+        elapsed = time.perf_counter() - start
+        print(f"import, 1 file:    {imported / elapsed:>10,.0f} lines/s (1 process)")
+
+        # Resuming a finished file only reads past the recorded offset
+        start = time.perf_counter()
+        again = import_sensor_log(paths[0], db_path)
+        print(f"resume, 1 file:    {again} new lines in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        db_path = os.path.join(tmp, 'parallel.db')
+        start = time.perf_counter()
+        counts = import_sensor_logs(paths, db_path, workers=args.workers)
+        elapsed = time.perf_counter() - start
+        total = sum(counts.values())
+        print(f"import, {args.files} files:   {total / elapsed:>10,.0f} lines/s ({size / 1e6:.0f} MB total, "
+              f"{args.workers or os.cpu_count()} worker(s))")
+
+        history = HistoryDatabase(db_path)
+        rows = history.query('main', 'co2', 0, time.time(), resolution='rollup_1d')
+        history.close()
+        print(f"daily rollups:     {len(rows)} days, {sum(row[4] for row in rows)} readings")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# SD-card writes per hour: open/append/close per line vs. the group-commit log writer
+import argparse
+import os
+import tempfile
+import time
+
+from SingleSCD40 import BufferedLogWriter, LOG_FLUSH_SECONDS
+
+
+def write_syscalls():
+    """Write syscalls made by this process so far (Linux), or None"""
+    try:
+        with open('/proc/self/io') as io:
+            return int(dict(line.split(': ') for line in io.read().splitlines())['syscw'])
+    except (OSError, KeyError):
+        return None
+
+
+def simulate_hour(write_line, lines_per_hour, scale, flush=None):
+    """Write lines evenly over one hour compressed by scale, calling flush every scaled flush interval"""
+    duration = 3600 / scale
+    start = time.monotonic()
+    next_flush = start + LOG_FLUSH_SECONDS / scale
+    for index in range(lines_per_hour):
+        due = start + index * duration / lines_per_hour
+        while True:
+            now = time.monotonic()
+            if flush and now >= next_flush:
+                flush()
+                next_flush += LOG_FLUSH_SECONDS / scale
+            if now >= due:
+                break
+            time.sleep(max(0.0, min(due, next_flush) - now if flush else due - now))
+        write_line(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - Room - Temperature: 70.1°F, Humidity: 41.2%, CO2: 612ppm\n")
+    if flush:
+        flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log writes per hour, old vs. group commit")
+    parser.add_argument('--lines-per-hour', type=int, default=7200, help="sensor and error lines per hour")
+    parser.add_argument('--scale', type=float, default=100, help="run one hour this many times faster")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'old.log')
+
+        def append_line(line):
+            with open(path, 'a') as file:
+                file.write(line)
+
+        before = write_syscalls()
+        simulate_hour(append_line, args.lines_per_hour, args.scale)
+        after = write_syscalls()
+        syscalls = f", {after - before} write syscalls" if before is not None else ""
+        print(f"open/append/close: {args.lines_per_hour} opens+closes, {args.lines_per_hour} writes{syscalls}, 0 fsyncs per hour")
+
+        for durability in ('commit', 'periodic', 'never'):
+            writer = BufferedLogWriter(os.path.join(tmp, f"{durability}.log"), flush_interval=3600,
+                                       durability=durability, fsync_interval=60 / args.scale)
+            before = write_syscalls()
+            simulate_hour(writer.write, args.lines_per_hour, args.scale, flush=writer.flush)
+            after = write_syscalls()
+            writer.close()
+            syscalls = f", {after - before} write syscalls" if before is not None else ""
+            print(f"group commit ({durability:>8}): 1 open, {writer.commits} writes{syscalls}, {writer.fsyncs} fsyncs per hour")
+
+
+if __name__ == '__main__':
+    main()
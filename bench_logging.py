@@ -0,0 +1,96 @@
+# Time the monitoring thread spends in logging per cycle: handlers called inline vs. the queue listener
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from queue import SimpleQueue
+
+from SingleSCD40 import BufferedLogWriter, DebugRateLimit, ErrorLogHandler, log_formatter
+
+
+def log_cycle(logger, cycle, sensors, errors_every):
+    """The records one monitoring cycle produces: tick, per-sensor readings and uploads, queue stats"""
+    logger.debug(f"Tick {cycle}: jitter 0.4 ms (max 2.1 ms, skipped 0)")
+    for sensor in range(sensors):
+        logger.info(f"Read values [sensor{sensor}] - Temp: 70.1°F (21.2°C), Humidity: 41.2%, CO2: 612ppm "
+                    f"(mean of 60 samples)")
+        for feed in ('temperature', 'humidity', 'co2'):
+            logger.debug(f"Sending to Adafruit IO - Feed: group.sensor{sensor}-{feed}, Value: 70.10")
+            logger.debug(f"Successfully sent to Adafruit IO - Feed: group.sensor{sensor}-{feed}, Value: 70.10")
+    logger.debug("I2C transactions per reading: 4.0")
+    logger.debug("Alert queue: {'depth': 0, 'delivered': 12, 'dropped': 0}")
+    logger.debug("Adafruit IO rate budget: {'tokens': 28.0, 'rate': 0.5}")
+    if errors_every and cycle % errors_every == 0:
+        logger.error(f"Error reading from sensor sensor0: CRC mismatch (cycle {cycle})")
+
+
+def measure(name, logger, args):
+    """Run the cycles and print per-cycle logging time on the calling thread"""
+    samples = []
+    for cycle in range(args.cycles):
+        start = time.perf_counter()
+        log_cycle(logger, cycle, args.sensors, args.errors_every)
+        samples.append(time.perf_counter() - start)
+        time.sleep(args.gap / 1000)
+    samples.sort()
+    print(f"{name:<26} mean {statistics.fmean(samples) * 1e6:8.0f} us  "
+          f"p50 {samples[len(samples) // 2] * 1e6:8.0f} us  "
+          f"p99 {samples[int(len(samples) * 0.99)] * 1e6:8.0f} us  per cycle")
+
+
+def make_logger(name):
+    logger = logging.getLogger(f"bench_logging.{name}")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    return logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging time per monitoring cycle, inline vs. queued handlers")
+    parser.add_argument('--cycles', type=int, default=2000)
+    parser.add_argument('--sensors', type=int, default=4)
+    parser.add_argument('--errors-every', type=int, default=10, help="log an error every N cycles (0 for none)")
+    parser.add_argument('--gap', type=float, default=2, help="milliseconds between cycles")
+    parser.add_argument('--debug-per-minute', type=int, default=6)
+    parser.add_argument('--console', action='store_true', help="write console output to stderr instead of /dev/null")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull:
+        console = sys.stderr if args.console else devnull
+
+        def handlers(label):
+            file_handler = RotatingFileHandler(os.path.join(tmp, f"{label}.log"), maxBytes=10 * 1024 * 1024,
+                                               backupCount=5)
+            file_handler.setFormatter(log_formatter)
+            error_log = BufferedLogWriter(os.path.join(tmp, f"{label}-error.log"))
+            return (file_handler, logging.StreamHandler(console), ErrorLogHandler(error_log)), error_log
+
+        # Before: every handler runs on the logging thread
+        inline, error_log = handlers('inline')
+        logger = make_logger('inline')
+        for handler in inline:
+            logger.addHandler(handler)
+        measure('inline handlers', logger, args)
+        error_log.close()
+
+        # After: records are queued and written by the listener thread, optionally rate limited
+        for label, per_minute in (('queued', 0), ('queued + debug limit', args.debug_per_minute)):
+            records = SimpleQueue()
+            queued, error_log = handlers(label.split()[0] + str(per_minute))
+            listener = QueueListener(records, *queued, respect_handler_level=True)
+            listener.start()
+            queue_handler = QueueHandler(records)
+            queue_handler.addFilter(DebugRateLimit(per_minute))
+            logger = make_logger(label)
+            logger.addHandler(queue_handler)
+            measure(label, logger, args)
+            listener.stop()
+            error_log.close()
+
+
+if __name__ == '__main__':
+    main()
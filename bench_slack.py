@@ -0,0 +1,83 @@
+# Per-alert latency: new WebClient + settings parse per alert vs. the pooled SlackClient
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from slack_sdk import WebClient
+
+from SingleSCD40 import SlackClient, read_settings_from_conf
+
+
+class FakeSlackHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Allow keep-alive
+    wbufsize = -1  # Send headers and body in one segment
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({'ok': True, 'channel': 'C123', 'ts': '1.0'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def write_conf(path):
+    with open(path, 'w') as conf:
+        conf.write("[General]\n"
+                   "sensor_location_name = Bench\nminutes_between_reads = 5\n"
+                   "sensor_threshold_temp = 88\nsensor_lower_threshold_temp = 40\n"
+                   "threshold_count = 3\nslack_api_token = xoxb-bench\nslack_channel = bench\n"
+                   "adafruit_io_username = u\nadafruit_io_key = k\nadafruit_io_group_name = g\n"
+                   "adafruit_io_temp_feed = t\nadafruit_io_humidity_feed = h\n"
+                   "adafruit_io_co2_feed = c\nsensor_co2_threshold = 1000\n")
+
+
+def per_alert(func, alerts):
+    latencies = []
+    for i in range(alerts):
+        start = time.perf_counter()
+        func(f"bench alert {i}")
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return sum(latencies) / alerts, latencies[int(alerts * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slack alert latency against a local fake Slack API")
+    parser.add_argument('--alerts', type=int, default=500)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSlackHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/api/"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conf_file = os.path.join(tmp, 'bench.conf')
+        write_conf(conf_file)
+
+        def per_alert_client(message):
+            settings = read_settings_from_conf(conf_file)
+            client = WebClient(token=settings['SLACK_API_TOKEN'], base_url=base_url)
+            client.chat_postMessage(channel=settings['SLACK_CHANNEL'], text=message)
+
+        settings = read_settings_from_conf(conf_file)
+        pooled = SlackClient(settings['SLACK_API_TOKEN'], settings['SLACK_CHANNEL'], base_url=base_url)
+
+        for name, func in (('per-alert', per_alert_client), ('pooled', pooled.post_message)):
+            mean, p99 = per_alert(func, args.alerts)
+            print(f"{name:>10}: mean {mean * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms per alert")
+
+    server.shutdown()
+    print("(plain HTTP locally; against slack.com the per-alert client also pays a TLS handshake)")
+
+
+if __name__ == '__main__':
+    main()
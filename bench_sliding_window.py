@@ -0,0 +1,56 @@
+# Cost per sample of windowed statistics: recomputing over the window vs. the O(1) SlidingWindow
+import argparse
+import math
+import random
+import time
+from collections import deque
+
+from SingleSCD40 import SlidingWindow, SCD4X_MEASUREMENT_PERIOD
+
+
+def recompute(window_samples, seconds, timestamp, value):
+    """Append, drop expired samples and recompute every statistic from scratch"""
+    window_samples.append((timestamp, value))
+    while window_samples[0][0] <= timestamp - seconds:
+        window_samples.popleft()
+    values = [sample for _, sample in window_samples]
+    mean = sum(values) / len(values)
+    return mean, min(values), max(values), math.sqrt(sum((sample - mean) ** 2 for sample in values) / len(values))
+
+
+def sliding(window, timestamp, value):
+    window.add(timestamp, value)
+    return tuple(window.statistic(name) for name in ('mean', 'min', 'max', 'stddev'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-sample cost of sliding-window alert statistics")
+    parser.add_argument('--samples', type=int, default=30000)
+    parser.add_argument('--windows', type=float, nargs='+', default=[1, 5, 15, 60, 240, 1440],
+                        help="window lengths in minutes")
+    args = parser.parse_args()
+
+    random.seed(1)
+    timestamps = [index * SCD4X_MEASUREMENT_PERIOD for index in range(args.samples)]
+    values = [800 + 300 * math.sin(index / 500) + random.gauss(0, 20) for index in range(args.samples)]
+
+    print(f"{'window':>8} {'samples':>8} {'recompute':>12} {'sliding':>10}")
+    for minutes in args.windows:
+        seconds = minutes * 60
+        window_samples, window = deque(), SlidingWindow(seconds)
+        results = {}
+        for label, update in (('recompute', lambda t, v: recompute(window_samples, seconds, t, v)),
+                              ('sliding', lambda t, v: sliding(window, t, v))):
+            start = time.perf_counter()
+            last = None
+            for timestamp, value in zip(timestamps, values):
+                last = update(timestamp, value)
+            results[label] = ((time.perf_counter() - start) / args.samples, last)
+        expected, actual = results['recompute'][1], results['sliding'][1]
+        assert all(math.isclose(a, b, rel_tol=1e-6, abs_tol=1e-6) for a, b in zip(expected, actual)), (expected, actual)
+        print(f"{minutes:>6g} m {window.count:>8} {results['recompute'][0] * 1e6:>9.1f} us "
+              f"{results['sliding'][0] * 1e6:>7.2f} us")
+
+
+if __name__ == '__main__':
+    main()
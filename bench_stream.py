@@ -0,0 +1,97 @@
+# /api/stream load test: hundreds of SSE subscribers, delivery latency, publisher cost and slow-consumer drops
+import argparse
+import json
+import selectors
+import socket
+import time
+from threading import Thread
+
+import SingleSCD40
+from SingleSCD40 import (OPTIONAL_SETTINGS, Reading, find_available_port, publish_latest, serve_app,
+                         shutdown_event, stream_broadcaster)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+
+def subscribe_all(port, count):
+    selector = selectors.DefaultSelector()
+    for _ in range(count):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(b'GET /api/stream HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n')
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ, bytearray())
+    return selector
+
+
+def read_events(selector, deadline, latencies, counts):
+    """Read every stream until the deadline, recording the age of each 'reading' event on arrival"""
+    while time.time() < deadline:
+        for key, _ in selector.select(timeout=0.1):
+            data = key.fileobj.recv(65536)
+            if not data:
+                selector.unregister(key.fileobj)
+                continue
+            buffer = key.data
+            buffer += data
+            while b'\n\n' in buffer:
+                event, _, rest = bytes(buffer).partition(b'\n\n')
+                buffer[:] = rest
+                if b'event: reading' in event:
+                    payload = json.loads(event.split(b'data: ', 1)[1])
+                    latencies.append(time.time() - payload['timestamp'])
+                    counts[key.fd] = counts.get(key.fd, 0) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server-Sent Events fan-out load test")
+    parser.add_argument('--subscribers', type=int, default=300)
+    parser.add_argument('--rate', type=float, default=20, help="readings published per second")
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--stalled', type=int, default=5, help="subscribers that never read")
+    args = parser.parse_args()
+    SingleSCD40.logger.setLevel('ERROR')
+
+    settings = {key: default for key, (default, choices) in OPTIONAL_SETTINGS.items()}
+    settings.update(WEB_THREADS=args.subscribers + 8, WEB_CONNECTION_LIMIT=args.subscribers + 50)
+    stream_broadcaster.max_clients = args.subscribers + args.stalled
+    port = find_available_port(5000)
+    Thread(target=serve_app, args=(port, settings), daemon=True).start()
+    time.sleep(1)
+
+    selector = subscribe_all(port, args.subscribers)
+    stalled = [stream_broadcaster.subscribe() for _ in range(args.stalled)]
+    while stream_broadcaster.stats()['subscribers'] < args.subscribers + args.stalled:
+        time.sleep(0.1)
+
+    latencies, counts = [], {}
+    reader = Thread(target=read_events, args=(selector, time.time() + args.duration + 2, latencies, counts))
+    reader.start()
+    publish_costs = []
+    published = 0
+    next_publish = time.perf_counter()
+    end = next_publish + args.duration
+    while next_publish < end:
+        start = time.perf_counter()
+        publish_latest(Reading('main', time.time(), 21.5, 45.0, 600.0 + published % 400))
+        publish_costs.append(time.perf_counter() - start)
+        published += 1
+        next_publish += 1 / args.rate
+        time.sleep(max(0.0, next_publish - time.perf_counter()))
+    reader.join()
+    shutdown_event.set()
+
+    delivered = sum(counts.values())
+    print(f"{args.subscribers} subscribers, {published} readings at {args.rate:g}/s")
+    print(f"delivered:  {delivered}/{published * args.subscribers} events "
+          f"({len(counts)} subscribers received events)")
+    print(f"latency:    p50 {percentile(latencies, 0.5) * 1000:.1f} ms  p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+    print(f"publish():  p50 {percentile(publish_costs, 0.5) * 1e6:.0f} us  p99 {percentile(publish_costs, 0.99) * 1e6:.0f} us")
+    print(f"stalled:    {sum(subscription.closed for subscription in stalled)}/{args.stalled} dropped "
+          f"(broadcaster stats {stream_broadcaster.stats()})")
+
+
+if __name__ == '__main__':
+    main()
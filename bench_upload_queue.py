@@ -0,0 +1,74 @@
+# Replay throughput of the on-disk upload queue against a local Adafruit IO stand-in
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Adafruit_IO import Client
+
+import SingleSCD40
+
+
+class FakeAdafruitHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+    requests = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        FakeAdafruitHandler.requests += 1
+        body = json.dumps([]).encode() if self.path.endswith(('/batch', '/data')) else b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload queue enqueue cost and replay throughput")
+    parser.add_argument('--readings', type=int, default=5000)
+    parser.add_argument('--sensors', type=int, default=4)
+    args = parser.parse_args()
+
+    SingleSCD40.logger.setLevel(logging.WARNING)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAdafruitHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    SingleSCD40.adafruit_io_client = Client('bench', 'key', base_url=f"http://127.0.0.1:{server.server_port}")
+    # Unlimited data rate so the replay measures the queue and HTTP path only
+    settings = {'ADAFRUIT_IO_USERNAME': 'bench', 'ADAFRUIT_IO_UPLOAD_MODE': 'batch', 'UPLOAD_QUEUE_RETENTION_DAYS': 30,
+                'ADAFRUIT_IO_RATE_LIMIT': 10 ** 9, 'UPLOAD_BACKLOG_HORIZON_MINUTES': 60}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'upload_queue.db')
+        for batch_size in (1, 10, 100, 500):
+            queue = SingleSCD40.UploadQueue(path)
+            start = time.perf_counter()
+            now = time.time() - args.readings * 300
+            for i in range(args.readings):
+                values = {f"temp-{i % args.sensors}": 70.0 + i % 5, f"humidity-{i % args.sensors}": 40.0,
+                          f"co2-{i % args.sensors}": 600 + i % 50}
+                queue.put(f"s{i % args.sensors}", 'bench', values, now + i)
+            enqueue = (time.perf_counter() - start) / args.readings
+
+            flusher = SingleSCD40.UploadFlusher(queue, settings, batch_size=batch_size)
+            FakeAdafruitHandler.requests = 0
+            start = time.perf_counter()
+            flusher.flush()
+            elapsed = time.perf_counter() - start
+            print(f"batch {batch_size:>4}: enqueue {enqueue * 1e6:.0f} us/reading, replay {args.readings / elapsed:,.0f} readings/s, "
+                  f"{FakeAdafruitHandler.requests} HTTP requests, {len(queue)} left")
+            queue.close()
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# Web UI load test: requests/s and latency percentiles per endpoint over keep-alive connections
+import argparse
+import configparser
+import http.client
+import logging
+import os
+import shutil
+import tempfile
+import time
+import urllib.parse
+from threading import Thread
+
+import SingleSCD40
+from SingleSCD40 import OPTIONAL_SETTINGS, Reading, app, find_available_port, serve_app, shutdown_event
+
+
+def client(host, port, paths, deadline, results, conditional):
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    etags = {}
+    while time.perf_counter() < deadline:
+        for path in paths:
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'If-None-Match': etags[path]} if path in etags else {})
+                response = connection.getresponse()
+                response.read()
+                ok = response.status < 500
+                if conditional and response.getheader('ETag'):
+                    etags[path] = response.getheader('ETag')
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                ok = False
+            results[path].append((time.perf_counter() - start, ok))
+    connection.close()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the web UI")
+    parser.add_argument('--url', help="test a running server (default: start one in-process)")
+    parser.add_argument('--server', choices=('waitress', 'development'), default='waitress')
+    parser.add_argument('--threads', type=int, default=OPTIONAL_SETTINGS['WEB_THREADS'][0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--path', action='append', dest='paths', help="endpoint to request (repeatable)")
+    parser.add_argument('--conditional', action='store_true', help="revalidate with If-None-Match (304 responses)")
+    args = parser.parse_args()
+    paths = args.paths or ['/settings']
+
+    if args.url:
+        target = urllib.parse.urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        # Serve from a scratch copy of the configuration; the template sits next to the script
+        repo = os.path.dirname(os.path.abspath(SingleSCD40.__file__))
+        workdir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(repo, 'SingleSensorSettings.conf'), workdir)
+        os.chdir(workdir)
+        config = configparser.ConfigParser(inline_comment_prefixes=('#',))
+        config.read('SingleSensorSettings.conf')
+        config['General'].setdefault('sensor_co2_threshold', config['General'].get('sensor_threshold_co2', '1000'))
+        with open('SingleSensorSettings.conf', 'w') as file:
+            config.write(file)
+        if not os.path.isdir(os.path.join(app.root_path, app.template_folder)):
+            app.template_folder = repo
+        SingleSCD40.logger.setLevel('WARNING')
+        SingleSCD40.publish_latest(Reading('main', time.time(), 21.5, 45.0, 612.0))
+        logging.getLogger('waitress.queue').setLevel('ERROR')  # Queueing is expected with more clients than threads
+        settings = {key: default for key, (default, choices) in OPTIONAL_SETTINGS.items()}
+        settings.update(WEB_SERVER=args.server, WEB_THREADS=args.threads, WEB_CONNECTION_LIMIT=args.clients * 2)
+        host, port = '127.0.0.1', find_available_port(5000)
+        Thread(target=serve_app, args=(port, settings), daemon=True).start()
+        for _ in range(50):
+            try:
+                http.client.HTTPConnection(host, port, timeout=1).request('GET', '/')
+                break
+            except OSError:
+                time.sleep(0.1)
+
+    results = {path: [] for path in paths}
+    deadline = time.perf_counter() + args.duration
+    clients = [Thread(target=client, args=(host, port, paths, deadline, results, args.conditional)) for _ in range(args.clients)]
+    started = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    shutdown_event.set()
+
+    print(f"{args.clients} keep-alive clients for {elapsed:.1f} s against "
+          f"{args.url or f'{args.server} ({args.threads} threads)'}")
+    for path, samples in results.items():
+        latencies = sorted(latency for latency, ok in samples)
+        errors = sum(1 for latency, ok in samples if not ok)
+        print(f"{path:<20} {len(samples) / elapsed:8.0f} req/s  p50 {percentile(latencies, 0.5) * 1000:6.1f} ms  "
+              f"p99 {percentile(latencies, 0.99) * 1000:6.1f} ms  errors {errors}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+# Import legacy sensor_readings.log files into the SQLite history database
+import argparse
+import logging
+
+import SingleSCD40
+from SingleSCD40 import HISTORY_DB_FILE, LOG_FILE, import_sensor_log, import_sensor_logs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream sensor log files into the history database")
+    parser.add_argument('paths', nargs='*', default=[LOG_FILE], help="sensor log files (default: %(default)s)")
+    parser.add_argument('--db', default=HISTORY_DB_FILE, help="history database (default: %(default)s)")
+    parser.add_argument('--sensor-id', default='main', help="sensor id for lines without one (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument('--offset', type=int, default=None,
+                        help="byte offset to start from (single file; default: resume where the last import stopped)")
+    args = parser.parse_args()
+    SingleSCD40.logger.setLevel(logging.INFO)
+
+    if args.offset is not None:
+        if len(args.paths) != 1:
+            parser.error("--offset applies to a single file")
+        counts = {args.paths[0]: import_sensor_log(args.paths[0], args.db, args.sensor_id, args.offset)}
+    else:
+        counts = import_sensor_logs(args.paths, args.db, args.sensor_id, args.workers)
+    for path, count in counts.items():
+        print(f"{path}: {count} reading(s)")
+
+
+if __name__ == '__main__':
+    main()